@@ -3,10 +3,30 @@ AI module for The Ultimate Overlay.
 Handles all AI-related functionality including code completion,
 text suggestions, and learning resource recommendations.
 """
+import os
+
+# These must be set before torch is first imported: tolerate the duplicate
+# OpenMP runtimes shipped by torch and MKL, and size the OpenMP pool to
+# roughly the physical core count
+os.environ.setdefault("KMP_DUPLICATE_LIB_OK", "TRUE")
+os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 2) // 2)))
+
+# Let the caching allocator grow segments in place instead of fragmenting
+# across repeated model load/unload cycles
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
+os.environ.setdefault("PYTORCH_ALLOC_CONF", "expandable_segments:True")
 
-from .model_manager import ModelManager
-from .completion import CompletionSystem
 from .context_analyzer import ContextAnalyzer
 from .config import AIConfig
 
-__all__ = ['ModelManager', 'CompletionSystem', 'ContextAnalyzer', 'AIConfig'] 
\ No newline at end of file
+__all__ = ['ModelManager', 'CompletionSystem', 'ContextAnalyzer', 'AIConfig']
+
+def __getattr__(name):
+    # ModelManager and CompletionSystem pull in torch; import them on first use
+    if name == 'ModelManager':
+        from .model_manager import ModelManager
+        return ModelManager
+    if name == 'CompletionSystem':
+        from .completion import CompletionSystem
+        return CompletionSystem
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}") 
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""
+Micro-batching helper for grouping concurrent inference requests.
+"""
+from queue import Queue, Empty
+from threading import Event, Lock, Thread
+from typing import Any, Callable, List, Optional
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _PendingItem:
+    """A submitted item waiting for its batch to be processed."""
+
+    __slots__ = ('item', 'result', 'error', 'done')
+
+    def __init__(self, item: Any):
+        self.item = item
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = Event()
+
+class MicroBatcher:
+    """Collects items submitted within a short window and processes them as one batch."""
+
+    def __init__(self,
+                 process_batch: Callable[[List[Any]], List[Any]],
+                 max_batch: int,
+                 window_ms: float):
+        self._process_batch = process_batch
+        self._max_batch = max(1, max_batch)
+        self._window = window_ms / 1000.0
+        self._queue: Queue = Queue()
+        self._lock = Lock()
+        self._worker_thread: Optional[Thread] = None
+
+    def submit(self, item: Any) -> Any:
+        """Submit an item and block until the batch containing it has been processed."""
+        pending = _PendingItem(item)
+        self._ensure_worker()
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def close(self) -> None:
+        """Stop the worker thread once the items already queued are processed."""
+        with self._lock:
+            if self._worker_thread is None:
+                return
+            self._queue.put(None)
+            self._worker_thread = None
+
+    def _ensure_worker(self) -> None:
+        """Start the worker thread on first use."""
+        with self._lock:
+            if self._worker_thread is None:
+                self._worker_thread = Thread(target=self._run, daemon=True)
+                self._worker_thread.start()
+
+    def _run(self) -> None:
+        """Gather up to max_batch items arriving within the window, then process them together."""
+        running = True
+        while running:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = [first]
+            deadline = time.monotonic() + self._window
+            while len(batch) < self._max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=remaining)
+                except Empty:
+                    break
+                if pending is None:
+                    running = False
+                    break
+                batch.append(pending)
+
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[_PendingItem]) -> None:
+        """Run the batch callback and hand each result back to its submitter."""
+        try:
+            results = self._process_batch([pending.item for pending in batch])
+            for pending, result in zip(batch, results):
+                pending.result = result
+        except Exception as e:
+            logger.error(f"Error processing batch of {len(batch)}: {str(e)}")
+            for pending in batch:
+                pending.error = e
+        finally:
+            for pending in batch:
+                pending.done.set()
@@ -2,68 +2,102 @@
 Completion system for handling different types of AI completions.
 """
 from typing import Dict, Any, Optional, List
-from queue import Queue
-from threading import Thread, Lock
+from threading import Thread, Event, Condition
 import time
 import logging
 from .model_manager import ModelManager
-from .context_analyzer import ContextAnalyzer
+from .context_analyzer import ContextAnalyzer, Context
+from .prompt_cache import PromptCache
 from .config import AIConfig
 
 logger = logging.getLogger(__name__)
 
+# Features tried in order for each context type; anything else is treated as text
+_FEATURE_PRIORITY = {
+    'code': ('code_completion', 'learning_suggestions'),
+    'web': ('text_suggestions', 'translation', 'learning_suggestions'),
+    'text': ('text_suggestions', 'translation'),
+}
+
+_PROMPT_TEMPLATES = {
+    ('code', 'code_completion'): "Complete the following {language} code:\n{content}",
+    ('code', 'learning_suggestions'): "Suggest learning resources for {language}:\n{content}",
+    ('web', 'text_suggestions'): "Suggest improvements for the following text:\n{content}",
+    ('web', 'translation'): "Translate the following text to English:\n{content}",
+    ('web', 'learning_suggestions'): "Suggest learning resources for the following topic:\n{content}",
+    ('text', 'text_suggestions'): "Suggest improvements for the following text:\n{content}",
+    ('text', 'translation'): "Translate the following text to English:\n{content}",
+}
+
 class CompletionSystem:
     """Handles different types of AI completions based on context."""
     
-    def __init__(self, config: AIConfig):
+    def __init__(self, config: AIConfig, model_manager: Optional[ModelManager] = None):
         self.config = config
-        self.model_manager = ModelManager(config)
+        self.model_manager = model_manager or ModelManager(config)
         self.context_analyzer = ContextAnalyzer(config)
-        self.completion_queue = Queue()
-        self.is_running = False
+        self.prompt_cache: Optional[PromptCache] = None
+        if config.use_cache:
+            self.prompt_cache = PromptCache(max_entries=config.prompt_cache_size)
+        # Single-slot "latest wins" request buffer: a newer request replaces
+        # any older one that the worker has not started yet.
+        self._request_ready = Condition()
+        self._pending_request: Optional[Dict[str, Any]] = None
+        self._stop_event = Event()
         self.worker_thread: Optional[Thread] = None
-        self.lock = Lock()
-        self.last_completion_time = 0
+        self.last_completion_time = 0.0
         self.completion_cooldown = 0.5  # seconds between completions
     
+    @property
+    def is_running(self) -> bool:
+        """Whether the worker thread is active."""
+        return self.worker_thread is not None and not self._stop_event.is_set()
+    
     def start(self) -> None:
         """Start the completion system."""
-        with self.lock:
-            if self.is_running:
-                return
-            
-            self.is_running = True
-            self.worker_thread = Thread(target=self._process_queue)
-            self.worker_thread.daemon = True
-            self.worker_thread.start()
-            logger.info("Completion system started")
+        if self.worker_thread and self.worker_thread.is_alive():
+            return
+        
+        self._stop_event.clear()
+        self.worker_thread = Thread(target=self._process_queue)
+        self.worker_thread.daemon = True
+        self.worker_thread.start()
+        logger.info("Completion system started")
     
     def stop(self) -> None:
         """Stop the completion system."""
-        with self.lock:
-            if not self.is_running:
-                return
-            
-            self.is_running = False
-            if self.worker_thread:
-                self.worker_thread.join()
-            self.model_manager.unload_model()
-            logger.info("Completion system stopped")
+        if self.worker_thread is None or self._stop_event.is_set():
+            return
+        
+        self._stop_event.set()
+        with self._request_ready:
+            self._pending_request = None
+            self._request_ready.notify()  # Wake the worker so it can exit
+        self.worker_thread.join()
+        self.worker_thread = None
+        self.model_manager.unload_model()
+        logger.info("Completion system stopped")
     
     def _process_queue(self) -> None:
-        """Process completion requests from the queue."""
-        while self.is_running:
+        """Process the most recent pending completion request."""
+        while not self._stop_event.is_set():
+            with self._request_ready:
+                while self._pending_request is None and not self._stop_event.is_set():
+                    self._request_ready.wait()
+                if self._stop_event.is_set():
+                    break
+                request = self._pending_request
+                self._pending_request = None
+            
             try:
-                if not self.completion_queue.empty():
-                    request = self.completion_queue.get()
-                    self._handle_completion_request(request)
-                time.sleep(0.1)  # Prevent busy waiting
+                self._handle_completion_request(request)
             except Exception as e:
                 logger.error(f"Error processing completion queue: {str(e)}")
     
     def _handle_completion_request(self, request: Dict[str, Any]) -> None:
         """Handle a completion request based on context."""
-        current_time = time.time()
+        # Drop requests inside the cooldown before doing any analysis work
+        current_time = time.monotonic()
         if current_time - self.last_completion_time < self.completion_cooldown:
             return
         
@@ -86,8 +120,19 @@ class CompletionSystem:
             # Generate appropriate prompt based on context and features
             prompt = self._generate_prompt(context, features)
             
+            # Reuse a cached completion for a repeated prompt
+            cache_key = (prompt, context.type, context.language)
+            completion = None
+            if self.prompt_cache is not None:
+                completion = self.prompt_cache.get(cache_key)
+            
             # Get completion from model
-            completion = self.model_manager.get_completion(prompt, context)
+            if completion is None:
+                # The prompt already carries the analyzed context; the manager's
+                # context argument expects file/app details, which it does not have
+                completion = self.model_manager.get_completion(prompt, None)
+                if completion and self.prompt_cache is not None:
+                    self.prompt_cache.put(cache_key, completion)
             
             if completion:
                 self.last_completion_time = current_time
@@ -97,38 +142,14 @@ class CompletionSystem:
         except Exception as e:
             logger.error(f"Error handling completion request: {str(e)}")
     
-    def _generate_prompt(self, context: Dict[str, Any], features: List[str]) -> str:
+    def _generate_prompt(self, context: Context, features: List[str]) -> str:
         """Generate appropriate prompt based on context and features."""
-        prompt_parts = []
-        
-        if context['type'] == 'code':
-            if 'code_completion' in features:
-                prompt_parts.append(f"Complete the following {context['language']} code:")
-                prompt_parts.append(context['content'])
-            elif 'learning_suggestions' in features:
-                prompt_parts.append(f"Suggest learning resources for {context['language']}:")
-                prompt_parts.append(context['content'])
-        
-        elif context['type'] == 'web':
-            if 'text_suggestions' in features:
-                prompt_parts.append("Suggest improvements for the following text:")
-                prompt_parts.append(context['content'])
-            elif 'translation' in features:
-                prompt_parts.append("Translate the following text to English:")
-                prompt_parts.append(context['content'])
-            elif 'learning_suggestions' in features:
-                prompt_parts.append("Suggest learning resources for the following topic:")
-                prompt_parts.append(context['content'])
-        
-        else:  # text, general
-            if 'text_suggestions' in features:
-                prompt_parts.append("Suggest improvements for the following text:")
-                prompt_parts.append(context['content'])
-            elif 'translation' in features:
-                prompt_parts.append("Translate the following text to English:")
-                prompt_parts.append(context['content'])
-        
-        return "\n".join(prompt_parts)
+        context_type = context.type if context.type in _FEATURE_PRIORITY else 'text'
+        feature = next((f for f in _FEATURE_PRIORITY[context_type] if f in features), None)
+        template = _PROMPT_TEMPLATES.get((context_type, feature))
+        if template is None:
+            return ""
+        return template.format(language=context.language, content=context.content)
     
     def request_completion(self, 
                          content: str, 
@@ -143,6 +164,8 @@ class CompletionSystem:
             'selection': selection,
             'file_extension': file_extension,
             'app_name': app_name,
-            'timestamp': time.time()
+            'timestamp': time.monotonic()
         }
-        self.completion_queue.put(request) 
\ No newline at end of file
+        with self._request_ready:
+            self._pending_request = request
+            self._request_ready.notify() 
\ No newline at end of file
@@ -2,29 +2,79 @@
 Completion system for handling AI completions.
 """
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator
 from .config import AIConfig
 from .model_manager import ModelManager
+from .model_downloader import ModelDownloader
 from .completion import CompletionSystem as BaseCompletionSystem
+from .disk_cache import DiskCompletionCache, completion_key
 
 logger = logging.getLogger(__name__)
 
+# Context entries that end up in the prompt; the rest (cursor position, window
+# title) would only split identical prompts across cache keys
+_PROMPT_CONTEXT_KEYS = ('app_name', 'file_extension')
+
 class CompletionSystem:
     """System for handling AI completions."""
     
-    def __init__(self, config: AIConfig):
+    def __init__(self, config: AIConfig, downloader: Optional[ModelDownloader] = None):
         self.config = config
-        self.model_manager = ModelManager(config)
-        self.base_system = BaseCompletionSystem(config)
+        # One manager shared with the base system so the model is only ever loaded once
+        self.model_manager = ModelManager(config, downloader=downloader)
+        self.base_system = BaseCompletionSystem(config, model_manager=self.model_manager)
+        # Completions for previously seen (text, context) requests, kept across restarts
+        self.disk_cache: Optional[DiskCompletionCache] = None
+        if config.use_cache and config.disk_cache_size > 0:
+            self.disk_cache = DiskCompletionCache(config.disk_cache_path, config.disk_cache_size)
+    
+    def _cache_key(self, text: str, context: Optional[Dict[str, Any]]) -> str:
+        if context:
+            context = {key: context.get(key) for key in _PROMPT_CONTEXT_KEYS}
+        return completion_key(
+            text, context, self.config.model_name,
+            self.config.temperature, self.config.top_p, self.config.max_length
+        )
+    
+    def _cache_get(self, text: str, context: Optional[Dict[str, Any]]) -> Optional[str]:
+        if self.disk_cache is None:
+            return None
+        return self.disk_cache.get(self._cache_key(text, context))
+    
+    def _cache_put(self, text: str, context: Optional[Dict[str, Any]], completion: Optional[str]) -> None:
+        if self.disk_cache is not None and completion:
+            self.disk_cache.put(self._cache_key(text, context), completion)
     
     def get_completion(self, text: str, context: Dict[str, Any] = None) -> Optional[str]:
         """Get a completion for the given text."""
+        completion = self._cache_get(text, context)
+        if completion is not None:
+            return completion
+        
         if not self.model_manager.is_model_available():
             logger.warning("Model not available for completion")
             return None
             
         try:
-            return self.model_manager.get_completion(text, context)
+            completion = self.model_manager.get_completion(text, context)
+            self._cache_put(text, context, completion)
+            return completion
         except Exception as e:
             logger.error(f"Error getting completion: {str(e)}")
-            return None 
\ No newline at end of file
+            return None 
+    
+    def stream_completion(self, text: str, context: Dict[str, Any] = None) -> Iterator[str]:
+        """Yield a completion for the given text piece by piece."""
+        completion = self._cache_get(text, context)
+        if completion is not None:
+            yield completion
+            return
+        
+        pieces = []
+        try:
+            for piece in self.model_manager.stream_completion(text, context):
+                pieces.append(piece)
+                yield piece
+            self._cache_put(text, context, "".join(pieces).strip())
+        except Exception as e:
+            logger.error(f"Error streaming completion: {str(e)}")
\ No newline at end of file
@@ -1,116 +1,202 @@
 """
 Configuration settings for the AI module.
 """
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional
-import json
+from dataclasses import dataclass, field, fields, asdict
+from functools import cached_property
+from typing import Any, Dict, List, Optional
 import os
 import tempfile
 import logging
 
+try:
+    import orjson
+    
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    
+    _loads = orjson.loads
+except ImportError:
+    import json
+    
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, indent=4).encode('utf-8')
+    
+    _loads = json.loads
+
 logger = logging.getLogger(__name__)
 
 # Get the absolute path to the project root
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 MODELS_DIR = os.path.join(PROJECT_ROOT, "models")
+_DEFAULT_MODEL_PATH = os.path.join(MODELS_DIR, "gpt2")
+_HOME_DIR = os.path.expanduser("~")
+
+def _detect_available_ram() -> Optional[int]:
+    """Return the available system RAM in bytes, or None if it cannot be detected."""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except Exception as e:
+        logger.warning(f"Error detecting RAM: {str(e)}")
+        return None
+
+# Probed once at import instead of on every AIConfig()
+_AVAILABLE_RAM_BYTES = _detect_available_ram()
 
+def _default_max_memory() -> Dict[int, str]:
+    """Set memory limits based on available RAM."""
+    if _AVAILABLE_RAM_BYTES is None:
+        # Fallback to conservative limit
+        logger.warning("Could not detect RAM, using default 2GB limit")
+        return {0: "2GB"}
+    
+    ram_gb = _AVAILABLE_RAM_BYTES / (1024 * 1024 * 1024)
+    if ram_gb > 8:
+        ram_limit = "4GB"  # Higher limit for systems with more RAM
+    elif ram_gb > 4:
+        ram_limit = "2GB"  # Medium limit
+    else:
+        ram_limit = "1GB"  # Lower limit for systems with less RAM
+    logger.info(f"Set memory limit to {ram_limit} based on {ram_gb:.2f}GB available RAM")
+    return {0: ram_limit}
+
+_DEFAULT_MAX_MEMORY = _default_max_memory()
+
+def _cpu_supports_bf16() -> bool:
+    """Check whether the CPU has native bfloat16 instructions (AVX512-BF16 or AMX)."""
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    flags = line.split()
+                    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+    except OSError:
+        pass
+    return False
+
+_CPU_SUPPORTS_BF16 = _cpu_supports_bf16()
+
+# Half the logical cores approximates the physical core count on SMT machines
+_DEFAULT_NUM_THREADS = max(1, (os.cpu_count() or 2) // 2)
+
+@dataclass
 class AIConfig:
     """Configuration for AI features."""
     
-    def __init__(self):
-        # Model settings - Using local model
-        self.model_name = "gpt2"  # The model name (for reference)
-        
-        # Set absolute path to model directory
-        self.model_path = os.path.join(MODELS_DIR, "gpt2")
-        logger.info(f"Model path set to: {self.model_path}")
+    # Model settings - Using local model
+    model_name: str = "gpt2"  # The model name (for reference)
+    backend: str = "transformers"  # "transformers" or "llama_cpp" (needs a GGUF file in model_path, see gguf_file)
+    gguf_file: str = ""  # GGUF file in the model repo to download and load for llama_cpp, e.g. "model-Q4_K_M.gguf"
+    
+    # Model parameters
+    context_window: int = 512
+    max_length: int = 100  # Limit response length
+    
+    # Generation settings
+    temperature: float = 0.7
+    top_p: float = 0.9
+    repetition_penalty: float = 1.2
+    no_repeat_ngram_size: int = 0  # 0 disables n-gram blocking
+    
+    # Memory settings - Optimized for local use
+    low_cpu_mem_usage: bool = True
+    torch_dtype: str = "auto"  # "auto" uses bfloat16 on CPUs with native support, else float32
+    quantization: str = "none"  # "none", "int8" (dynamic, CPU; faster but changes output) or "4bit" (bitsandbytes, CUDA)
+    max_memory: Dict[int, str] = field(default_factory=lambda: dict(_DEFAULT_MAX_MEMORY))
+    offload_state_dict: bool = True
+    
+    # Feature settings - Optimized for performance
+    enabled: bool = True
+    enable_code_completion: bool = True
+    enable_text_suggestions: bool = True
+    enable_translation: bool = True
+    enable_learning_suggestions: bool = True
+    code_languages: List[str] = field(default_factory=lambda: [
+        "python", "javascript", "html", "css", "sql", "r", "java", "c", "cpp"
+    ])
+    batch_size: int = 1  # Max requests grouped into one generate call; 1 disables batching
+    batch_window_ms: float = 10.0  # How long to wait for more requests to batch
+    num_threads: int = _DEFAULT_NUM_THREADS  # Intra-op threads for generation
+    compile_model: bool = False  # torch.compile the forward pass (slow first completion, faster after)
+    load_parallelism: int = min(4, os.cpu_count() or 1)  # Threads prefetching weight files before a load; 1 disables it
+    model_park_secs: int = 60  # How long a disabled model stays loaded for a quick re-enable; 0 keeps it until freed
+    evict_weight_cache: bool = False  # Drop weight files from the OS page cache after loading (frees RAM, slower next load)
+    inference_process: bool = False  # Run the model in a child process so generation never holds the GUI's GIL
+    use_cache: bool = True  # Enable caching for better performance
+    prompt_cache_size: int = 512  # Max completions kept in the prompt cache
+    disk_cache_size: int = 1000  # Max completions kept on disk across restarts; 0 disables it
+    
+    @property
+    def resolved_torch_dtype(self) -> str:
+        """Name of the torch dtype to load weights in."""
+        if self.torch_dtype == "auto":
+            return "bfloat16" if _CPU_SUPPORTS_BF16 else "float32"
+        return self.torch_dtype
+    
+    @cached_property
+    def model_path(self) -> str:
+        """Absolute path to the local model directory, resolved on first access."""
+        model_path = _DEFAULT_MODEL_PATH
+        logger.info(f"Model path set to: {model_path}")
         
         # Verify model path exists
-        if os.path.exists(self.model_path):
-            logger.info(f"Found model at: {self.model_path}")
-            # List model files
-            if os.path.isdir(self.model_path):
-                files = os.listdir(self.model_path)
+        if os.path.exists(model_path):
+            logger.info(f"Found model at: {model_path}")
+            # List model files, only when the listing would actually be logged
+            if logger.isEnabledFor(logging.INFO) and os.path.isdir(model_path):
+                files = os.listdir(model_path)
                 logger.info(f"Model directory contains {len(files)} files")
                 for file in files:
                     if file.endswith('.bin'):
                         logger.info(f"Found model file: {file}")
         else:
-            logger.warning(f"Model path does not exist: {self.model_path}")
+            logger.warning(f"Model path does not exist: {model_path}")
             logger.warning(f"Current working directory: {os.getcwd()}")
             logger.warning(f"Project root: {PROJECT_ROOT}")
             # Try to find alternate model location
             alt_path = os.path.abspath("models/gpt2")
             logger.warning(f"Trying alternate path: {alt_path}")
             if os.path.exists(alt_path):
-                self.model_path = alt_path
-                logger.info(f"Using alternate model path: {self.model_path}")
-        
-        # Model parameters
-        self.context_window = 512
-        self.max_length = 100  # Limit response length
-        
-        # Generation settings
-        self.temperature = 0.7
-        self.top_p = 0.9
-        self.repetition_penalty = 1.2
-        self.no_repeat_ngram_size = 3
-        
-        # Memory settings - Optimized for local use
-        self.low_cpu_mem_usage = True
-        self.torch_dtype = "float32"  # Use float32 for better compatibility
-        
-        # Set memory limits based on available RAM
+                model_path = alt_path
+                logger.info(f"Using alternate model path: {model_path}")
+        return model_path
+    
+    @cached_property
+    def offload_folder(self) -> str:
+        """Directory for offloaded weights, created on first access."""
         try:
-            import psutil
-            available_ram = psutil.virtual_memory().available
-            ram_gb = available_ram / (1024 * 1024 * 1024)
-            if ram_gb > 8:
-                ram_limit = "4GB"  # Higher limit for systems with more RAM
-            elif ram_gb > 4:
-                ram_limit = "2GB"  # Medium limit
-            else:
-                ram_limit = "1GB"  # Lower limit for systems with less RAM
-            self.max_memory = {0: ram_limit}
-            logger.info(f"Set memory limit to {ram_limit} based on {ram_gb:.2f}GB available RAM")
-        except Exception as e:
-            # Fallback to conservative limit
-            self.max_memory = {0: "2GB"}
-            logger.warning(f"Error detecting RAM, using default 2GB limit: {str(e)}")
-        
-        # Offload settings
+            offload_folder = os.path.join(_HOME_DIR, ".ultimate_overlay", "offload")
+            os.makedirs(offload_folder, exist_ok=True)
+        except Exception:
+            offload_folder = os.path.join(tempfile.gettempdir(), "ultimate_overlay_offload")
+            os.makedirs(offload_folder, exist_ok=True)
+        return offload_folder
+    
+    @cached_property
+    def disk_cache_path(self) -> str:
+        """SQLite file for the persistent completion cache, its directory created on first access."""
         try:
-            home_dir = os.path.expanduser("~")
-            self.offload_folder = os.path.join(home_dir, ".ultimate_overlay", "offload")
-            os.makedirs(self.offload_folder, exist_ok=True)
-            self.offload_state_dict = True
-        except Exception as e:
-            import tempfile
-            self.offload_folder = os.path.join(tempfile.gettempdir(), "ultimate_overlay_offload")
-            os.makedirs(self.offload_folder, exist_ok=True)
-            self.offload_state_dict = True
-        
-        # Feature settings - Optimized for performance
-        self.enabled = True
-        self.code_languages = ["python", "javascript", "html", "css", "sql", "r", "java", "c", "cpp"]
-        self.batch_size = 1
-        self.num_threads = 2  # Use 2 threads for better performance
-        self.use_cache = True  # Enable caching for better performance
+            cache_dir = os.path.join(_HOME_DIR, ".ultimate_overlay")
+            os.makedirs(cache_dir, exist_ok=True)
+        except Exception:
+            cache_dir = tempfile.gettempdir()
+        return os.path.join(cache_dir, "completions.sqlite3")
     
     @classmethod
     def load(cls, config_path: str = "config/ai_config.json") -> 'AIConfig':
         """Load configuration from JSON file."""
         if os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config_dict = json.load(f)
-            return cls(**config_dict)
+            with open(config_path, 'rb') as f:
+                config_dict = _loads(f.read())
+            known = {f.name for f in fields(cls)}
+            return cls(**{k: v for k, v in config_dict.items() if k in known})
         return cls()
     
     def save(self, config_path: str = "config/ai_config.json") -> None:
         """Save configuration to JSON file."""
         os.makedirs(os.path.dirname(config_path), exist_ok=True)
-        with open(config_path, 'w') as f:
-            json.dump(self.__dict__, f, indent=4)
+        with open(config_path, 'wb') as f:
+            f.write(_dumps(asdict(self)))
     
     def update(self, **kwargs) -> None:
         """Update configuration settings."""
@@ -1,35 +1,103 @@
 """
 Context analyzer for determining the current context and appropriate AI features.
 """
-from typing import Dict, Any, Optional, List
+from dataclasses import dataclass, replace
+from typing import Optional, List
 import re
 from .config import AIConfig
 
+# Code-like patterns fused into one alternation so content is scanned once
+_COMBINED_CODE_RE = re.compile(
+    r'def\s+\w+\s*\('  # Python function
+    r'|function\s+\w+\s*\('  # JavaScript function
+    r'|class\s+\w+'  # Class definition
+    r'|import\s+\w+'  # Import statement
+    r'|#include\s+<'  # C++ include
+)
+
+# Literal keyword each code pattern starts with. When pyahocorasick is
+# available these are matched in one linear pass and the regex only has to
+# confirm the few candidate positions.
+_CODE_ANCHORS = ('def', 'function', 'class', 'import', '#include')
+
+try:
+    import ahocorasick
+    
+    _CODE_AUTOMATON = ahocorasick.Automaton()
+    for _anchor in _CODE_ANCHORS:
+        _CODE_AUTOMATON.add_word(_anchor, len(_anchor))
+    _CODE_AUTOMATON.make_automaton()
+except ImportError:
+    _CODE_AUTOMATON = None
+
+def _looks_like_code(content: str) -> bool:
+    """Check whether the content contains any code-like pattern."""
+    if _CODE_AUTOMATON is None:
+        return _COMBINED_CODE_RE.search(content) is not None
+    for end, length in _CODE_AUTOMATON.iter(content):
+        if _COMBINED_CODE_RE.match(content, end - length + 1):
+            return True
+    return False
+
+# File extension to programming language
+_EXT_MAP = {
+    '.py': 'python',
+    '.js': 'javascript',
+    '.java': 'java',
+    '.cpp': 'cpp',
+    '.cs': 'csharp',
+    '.php': 'php',
+    '.rb': 'ruby',
+    '.swift': 'swift',
+    '.go': 'go',
+    '.rs': 'rust',
+    '.ts': 'typescript'
+}
+
+# Common applications to context types
+_APP_MAP = {
+    'chrome': 'web',
+    'firefox': 'web',
+    'edge': 'web',
+    'code': 'code',
+    'pycharm': 'code',
+    'sublime': 'code',
+    'notepad++': 'text',
+    'word': 'text',
+    'excel': 'spreadsheet'
+}
+
+@dataclass
+class Context:
+    """Snapshot of the context a completion is requested in."""
+    
+    type: Optional[str] = None  # 'code', 'text', 'web', etc.
+    language: Optional[str] = None  # programming language if code
+    content: str = ""  # current content
+    cursor_position: int = 0  # cursor position
+    selection: Optional[str] = None  # selected text if any
+
 class ContextAnalyzer:
     """Analyzes the current context to determine appropriate AI features."""
     
     def __init__(self, config: AIConfig):
         self.config = config
-        self.current_context: Dict[str, Any] = {
-            'type': None,  # 'code', 'text', 'web', etc.
-            'language': None,  # programming language if code
-            'content': None,  # current content
-            'cursor_position': None,  # cursor position
-            'selection': None  # selected text if any
-        }
+        self.current_context = Context()
     
     def analyze_context(self, 
                        content: str, 
                        cursor_position: int, 
                        selection: Optional[str] = None,
                        file_extension: Optional[str] = None,
-                       app_name: Optional[str] = None) -> Dict[str, Any]:
-        """Analyze the current context and determine appropriate features."""
-        self.current_context.update({
-            'content': content,
-            'cursor_position': cursor_position,
-            'selection': selection
-        })
+                       app_name: Optional[str] = None) -> Context:
+        """Analyze the current context and determine appropriate features.
+        
+        Returns a copy, so later calls do not change what callers hold on to.
+        """
+        context = self.current_context
+        context.content = content
+        context.cursor_position = cursor_position
+        context.selection = selection
         
         # Determine context type
         if file_extension:
@@ -39,95 +107,49 @@ class ContextAnalyzer:
         else:
             self._analyze_general_context(content)
         
-        return self.current_context
+        return replace(context)
     
     def _analyze_file_context(self, file_extension: str) -> None:
         """Analyze context based on file extension."""
-        extension_map = {
-            '.py': 'python',
-            '.js': 'javascript',
-            '.java': 'java',
-            '.cpp': 'cpp',
-            '.cs': 'csharp',
-            '.php': 'php',
-            '.rb': 'ruby',
-            '.swift': 'swift',
-            '.go': 'go',
-            '.rs': 'rust',
-            '.ts': 'typescript'
-        }
-        
-        language = extension_map.get(file_extension.lower())
+        language = _EXT_MAP.get(file_extension.lower())
         if language:
-            self.current_context.update({
-                'type': 'code',
-                'language': language
-            })
+            self.current_context.type = 'code'
+            self.current_context.language = language
         else:
-            self.current_context.update({
-                'type': 'text',
-                'language': None
-            })
+            self.current_context.type = 'text'
+            self.current_context.language = None
     
     def _analyze_app_context(self, app_name: str) -> None:
         """Analyze context based on application name."""
-        # Map common applications to context types
-        app_map = {
-            'chrome': 'web',
-            'firefox': 'web',
-            'edge': 'web',
-            'code': 'code',
-            'pycharm': 'code',
-            'sublime': 'code',
-            'notepad++': 'text',
-            'word': 'text',
-            'excel': 'spreadsheet'
-        }
-        
-        context_type = app_map.get(app_name.lower(), 'general')
-        self.current_context.update({
-            'type': context_type,
-            'language': None
-        })
+        context_type = _APP_MAP.get(app_name.lower(), 'general')
+        self.current_context.type = context_type
+        self.current_context.language = None
     
     def _analyze_general_context(self, content: str) -> None:
         """Analyze context based on content."""
         # Check for code-like patterns
-        code_patterns = [
-            r'def\s+\w+\s*\(',  # Python function
-            r'function\s+\w+\s*\(',  # JavaScript function
-            r'class\s+\w+',  # Class definition
-            r'import\s+\w+',  # Import statement
-            r'#include\s+<',  # C++ include
-        ]
-        
-        for pattern in code_patterns:
-            if re.search(pattern, content):
-                self.current_context.update({
-                    'type': 'code',
-                    'language': None  # Language detection would need more context
-                })
-                return
+        if _looks_like_code(content):
+            self.current_context.type = 'code'
+            self.current_context.language = None  # Language detection would need more context
+            return
         
-        self.current_context.update({
-            'type': 'text',
-            'language': None
-        })
+        self.current_context.type = 'text'
+        self.current_context.language = None
     
     def get_available_features(self) -> List[str]:
         """Get list of available AI features for current context."""
         features = []
         
-        if not self.current_context['type']:
+        if not self.current_context.type:
             return features
         
-        if self.current_context['type'] == 'code':
+        if self.current_context.type == 'code':
             if self.config.enable_code_completion:
                 features.append('code_completion')
             if self.config.enable_learning_suggestions:
                 features.append('learning_suggestions')
         
-        elif self.current_context['type'] == 'web':
+        elif self.current_context.type == 'web':
             if self.config.enable_text_suggestions:
                 features.append('text_suggestions')
             if self.config.enable_translation:
@@ -0,0 +1,101 @@
+"""
+Persistent completion cache so repeated queries skip the model across restarts.
+"""
+from threading import Lock
+from typing import Any, Dict, Optional
+import hashlib
+import logging
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+def completion_key(text: str, context: Optional[Dict[str, Any]] = None, model_name: str = "",
+                   temperature: Optional[float] = None, top_p: Optional[float] = None,
+                   max_length: Optional[int] = None) -> str:
+    """Hash a (text, context) request and the settings it was generated with into a fixed-length cache key."""
+    context_repr = repr(sorted(context.items())) if context else ""
+    return hashlib.blake2b(
+        f"{model_name}|{temperature}|{top_p}|{max_length}|{text}|{context_repr}".encode("utf-8"),
+        digest_size=16
+    ).hexdigest()
+
+class DiskCompletionCache:
+    """SQLite-backed completion cache that evicts the least recently used entries."""
+
+    def __init__(self, path: str, max_entries: int = 1000):
+        self._max_entries = max_entries
+        self._lock = Lock()
+        # last_used times of cache hits, written with the next put() so reads never commit
+        self._touched: Dict[str, float] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, completion TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS completions_lru ON completions (last_used)")
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Disk completion cache disabled: {str(e)}")
+            self._conn = None
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached completion for the key, marking it as recently used."""
+        if self._conn is None:
+            return None
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT completion FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                self._touched[key] = time.time()
+                return row[0]
+            except sqlite3.Error as e:
+                logger.error(f"Error reading disk completion cache: {str(e)}")
+                return None
+
+    def put(self, key: str, completion: str) -> None:
+        """Store a completion, evicting the oldest entries beyond max_entries."""
+        if self._conn is None:
+            return
+        with self._lock:
+            try:
+                # Record hits first so eviction sees them
+                self._flush_touched()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO completions (key, completion, last_used) VALUES (?, ?, ?)",
+                    (key, completion, time.time())
+                )
+                self._conn.execute(
+                    "DELETE FROM completions WHERE key IN ("
+                    "SELECT key FROM completions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self._max_entries,)
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing disk completion cache: {str(e)}")
+
+    def _flush_touched(self) -> None:
+        """Write the pending last_used times; the caller holds the lock and commits."""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE completions SET last_used = ? WHERE key = ?",
+                [(last_used, key) for key, last_used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def close(self) -> None:
+        """Close the underlying database."""
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._flush_touched()
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Error writing disk completion cache: {str(e)}")
+                self._conn.close()
+                self._conn = None
\ No newline at end of file
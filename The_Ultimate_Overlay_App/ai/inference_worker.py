@@ -0,0 +1,178 @@
+"""
+Child-process inference worker, so generation does not compete with the GUI for the GIL.
+"""
+import copy
+import logging
+import multiprocessing
+import threading
+from typing import Any, Dict, Iterator, Optional
+from .config import AIConfig
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for the child process to load the model
+_START_TIMEOUT = 600.0
+# Seconds to wait for the child process to exit before terminating it
+_STOP_TIMEOUT = 5.0
+
+def _worker_main(config: AIConfig, conn) -> None:
+    """Child process entry point: load the model, then serve requests until told to stop."""
+    from .model_manager import ModelManager
+
+    manager = ModelManager(config)
+    conn.send(bool(manager.load_model()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        kind, payload = message
+        try:
+            if kind == "complete":
+                conn.send(("result", manager.get_completion(*payload)))
+            elif kind == "stream":
+                pieces = manager.stream_completion(*payload)
+                try:
+                    for piece in pieces:
+                        conn.send(("chunk", piece))
+                        # The parent cancels when its consumer abandons the stream
+                        if conn.poll() and conn.recv()[0] == "cancel":
+                            break
+                finally:
+                    # Closing the stream sets its stop event and ends the generation
+                    pieces.close()
+                conn.send(("result", None))
+            elif kind == "cancel":
+                # The stream it was meant for already finished
+                continue
+            else:
+                conn.send(("error", f"Unknown request: {kind}"))
+        except Exception as e:
+            logger.error(f"Error in inference worker: {str(e)}")
+            conn.send(("error", str(e)))
+
+    manager.unload_model()
+
+class InferenceWorker:
+    """Runs a ModelManager in a separate process and forwards completion requests to it."""
+
+    def __init__(self, config: AIConfig):
+        # The child must load the model itself rather than spawn another worker
+        self.config = copy.copy(config)
+        self.config.inference_process = False
+        self._process = None
+        self._conn = None
+        # One request in flight at a time; replies arrive in order on the pipe
+        self._lock = threading.Lock()
+
+    def start(self) -> bool:
+        """Spawn the worker process and block until it has loaded the model."""
+        # spawn rather than fork: forking a process that already runs threads is unsafe
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(
+            target=_worker_main,
+            args=(self.config, child_conn),
+            name="inference-worker",
+            daemon=True
+        )
+
+        try:
+            process.start()
+            child_conn.close()
+            loaded = parent_conn.poll(_START_TIMEOUT) and parent_conn.recv()
+        except Exception as e:
+            logger.error(f"Error starting inference worker: {str(e)}")
+            loaded = False
+
+        if not loaded:
+            logger.error("Inference worker failed to load the model")
+            parent_conn.close()
+            if process.is_alive():
+                process.terminate()
+            return False
+
+        self._process = process
+        self._conn = parent_conn
+        logger.info(f"Inference worker started (pid {process.pid})")
+        return True
+
+    def is_alive(self) -> bool:
+        """Check whether the worker process is running."""
+        return self._process is not None and self._process.is_alive()
+
+    def stop(self) -> None:
+        """Ask the worker process to exit, terminating it if it does not."""
+        with self._lock:
+            if self._process is None:
+                return
+            try:
+                self._conn.send(None)
+            except Exception:
+                pass
+            self._process.join(_STOP_TIMEOUT)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._conn.close()
+            self._process = None
+            self._conn = None
+
+    def request(self, prompt: str, context: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Get a completion from the worker process."""
+        return self._call("complete", (prompt, context))
+
+    def stream(self, prompt: str, context: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Yield a completion's text piece by piece as the worker process generates it."""
+        with self._lock:
+            if not self.is_alive():
+                logger.warning("Inference worker is not running")
+                return
+            finished = False
+            try:
+                self._conn.send(("stream", (prompt, context)))
+                while True:
+                    kind, value = self._conn.recv()
+                    if kind == "chunk":
+                        yield value
+                        continue
+                    finished = True
+                    if kind == "error":
+                        logger.error(f"Inference worker error: {value}")
+                    return
+            except (EOFError, OSError) as e:
+                finished = True
+                logger.error(f"Lost connection to inference worker: {str(e)}")
+            finally:
+                # Stop the generation of an abandoned stream, then drain the chunks
+                # still in flight so the next request does not read this one's replies
+                if not finished:
+                    try:
+                        self._conn.send(("cancel", None))
+                    except OSError:
+                        finished = True
+                while not finished:
+                    try:
+                        finished = self._conn.recv()[0] != "chunk"
+                    except (EOFError, OSError):
+                        finished = True
+
+    def _call(self, kind: str, payload: Any) -> Any:
+        """Send one request and wait for its reply."""
+        with self._lock:
+            if not self.is_alive():
+                logger.warning("Inference worker is not running")
+                return None
+            try:
+                self._conn.send((kind, payload))
+                status, value = self._conn.recv()
+            except (EOFError, OSError) as e:
+                logger.error(f"Lost connection to inference worker: {str(e)}")
+                return None
+            if status == "error":
+                logger.error(f"Inference worker error: {value}")
+                return None
+            return value
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""
+llama.cpp backend for running GGUF quantized models on the CPU.
+"""
+import os
+import logging
+from typing import Optional
+from .config import AIConfig
+
+logger = logging.getLogger(__name__)
+
+def find_gguf(model_path: str, gguf_file: str = "") -> Optional[str]:
+    """Return the GGUF file to load from the model directory, if any.
+    
+    gguf_file names the file; without it, a lone *.gguf in the directory is used.
+    """
+    if gguf_file:
+        path = os.path.join(model_path, gguf_file)
+        return path if os.path.isfile(path) else None
+    if not os.path.isdir(model_path):
+        return None
+    names = sorted(name for name in os.listdir(model_path) if name.endswith('.gguf'))
+    if len(names) > 1:
+        logger.warning(f"Several GGUF files in {model_path}, set gguf_file to choose one: {', '.join(names)}")
+        return None
+    return os.path.join(model_path, names[0]) if names else None
+
+def load_llama(config: AIConfig, model_path: Optional[str] = None):
+    """Load the model's GGUF file with llama-cpp-python.
+    
+    model_path defaults to config.model_path. Returns None when the package
+    or a GGUF file is unavailable. The GGUF bundles its own tokenizer, so no
+    Hugging Face tokenizer is needed.
+    """
+    try:
+        from llama_cpp import Llama
+    except ImportError:
+        logger.warning("llama-cpp-python is not installed, install it with: pip install llama-cpp-python")
+        return None
+    
+    model_path = model_path or config.model_path
+    gguf_path = find_gguf(model_path, config.gguf_file)
+    if gguf_path is None:
+        logger.warning(f"No GGUF file found in {model_path}")
+        return None
+    
+    logger.info(f"Loading GGUF model from {gguf_path}")
+    return Llama(
+        model_path=gguf_path,
+        n_ctx=config.context_window,
+        n_threads=os.cpu_count(),
+        n_batch=512,
+        use_mmap=True,  # Map the weights rather than copying them; shared through the page cache
+        verbose=False
+    )
\ No newline at end of file
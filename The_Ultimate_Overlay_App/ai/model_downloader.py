@@ -6,68 +6,371 @@ import logging
 import shutil
 import time
 import json
-from pathlib import Path
-from typing import Optional, Callable, Dict, List
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from huggingface_hub import snapshot_download, HfFolder
+import multiprocessing
+import random
+import re
+import signal
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Dict, List, Tuple
+
+# Use the Rust transfer client when it is installed. This has to be set before
+# huggingface_hub is imported, and must stay unset without the package since
+# the hub then refuses to download at all.
+try:
+    import hf_transfer  # noqa: F401
+    _HF_TRANSFER_AVAILABLE = True
+    os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
+except ImportError:
+    _HF_TRANSFER_AVAILABLE = False
+
+try:
+    import orjson
+    _loads_buffer = orjson.loads
+except ImportError:
+    # json.loads does not take memoryviews
+    def _loads_buffer(data) -> object:
+        return json.loads(bytes(data))
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# JSON files above this size are stream-parsed with ijson when it is installed
+_STREAM_PARSE_THRESHOLD = 1 << 20
+
+# safetensors refuses headers larger than this, so a bigger length means a corrupt file
+_SAFETENSORS_MAX_HEADER = 100 << 20
+
+# torch, transformers and huggingface_hub are imported where they are used so
+# that importing this module stays cheap until a download or load happens
 from tqdm import tqdm
 from .config import AIConfig
-import torch
+from .llama_backend import find_gguf
 
 logger = logging.getLogger(__name__)
 
+_REQUIRED_FILES = (
+    'config.json',
+    'tokenizer.json',
+    'tokenizer_config.json',
+    'special_tokens_map.json',
+    'vocab.json',
+    'merges.txt'
+)
+
+# Any one weight layout will do; safetensors is preferred
+_WEIGHT_FILES = ('model.safetensors', 'model.safetensors.index.json', 'pytorch_model.bin')
+
+# Written next to a verified model; holds config.json's mtime and size and the
+# weight file sizes at that time
+_SENTINEL_FILE = '.verified'
+
+# Pause between the two size checks that catch weight files still being written
+_SIZE_SETTLE_SECS = 0.05
+
+# Model directories a download_model() call in this process is writing to
+_active_downloads = set()
+_active_downloads_lock = threading.Lock()
+
+# How often a download waiting on its worker process checks for cancellation
+_CANCEL_POLL_SECS = 0.1
+
+# aria2c processes this process is waiting on, killed if its download is terminated
+_aria2c_processes = set()
+
+_SHA256_RE = re.compile(r'[0-9a-f]{64}')
+
+# Per-thread read buffer for JSON checks; files are verified from several threads
+_SCRATCH_SIZE = 1 << 16
+_scratch = threading.local()
+
+def has_safetensors(model_path: str) -> bool:
+    """Check whether the model directory holds safetensors weights."""
+    return (os.path.exists(os.path.join(model_path, "model.safetensors"))
+            or os.path.exists(os.path.join(model_path, "model.safetensors.index.json")))
+
+def weight_files(model_path: str) -> List[str]:
+    """Paths of the weight files a load reads; only one format is used, preferably safetensors."""
+    paths = [
+        entry.path for entry in os.scandir(model_path)
+        if entry.name.endswith(('.safetensors', '.bin')) and entry.is_file()
+    ]
+    safetensors_files = [path for path in paths if path.endswith('.safetensors')]
+    return safetensors_files or paths
+
+def _advise_willneed(paths: List[str]) -> None:
+    """Start asynchronous readahead of the files so a following load finds them cached."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.debug(f"Could not prefetch {path}: {str(e)}")
+
+def _model_file_sizes(model_path: str) -> Dict[str, int]:
+    """Sizes of the weight and GGUF files in the model directory, by file name."""
+    try:
+        return {
+            entry.name: entry.stat().st_size for entry in os.scandir(model_path)
+            if entry.name.endswith(('.safetensors', '.bin', '.gguf')) and entry.is_file()
+        }
+    except OSError:
+        return {}
+
+class DownloadCancelled(Exception):
+    """Raised inside a download when cancel_download() has been called."""
+
+def _progress_tqdm(progress_callback: Optional[Callable[[int], None]]) -> type:
+    """Build a tqdm class that forwards snapshot_download's own progress as a percentage.
+    
+    Updates are forwarded at most every 10 ms and stop at 99; the caller
+    reports 100 once the download has been verified.
+    """
+    class _ProgressTqdm(tqdm):
+        _last_progress = -1
+        _last_progress_time = 0.0
+        
+        def __iter__(self):
+            # snapshot_download iterates over finished files rather than calling update()
+            done = self.n
+            for item in super().__iter__():
+                done += 1
+                self._report(done)
+                yield item
+        
+        def update(self, n=1):
+            displayed = super().update(n)
+            self._report(self.n)
+            return displayed
+        
+        def _report(self, done: int) -> None:
+            if not progress_callback or not self.total:
+                return
+            progress = min(99, int(done * 100 / self.total))
+            now = time.monotonic()
+            if progress == self._last_progress or now - self._last_progress_time < 0.01:
+                return
+            self._last_progress = progress
+            self._last_progress_time = now
+            try:
+                progress_callback(progress)
+            except Exception as e:
+                logger.warning(f"Error updating progress: {str(e)}")
+    
+    return _ProgressTqdm
+
+def _kill_aria2c_and_exit(signum, frame) -> None:
+    """SIGTERM handler of the download process: stop its aria2c transfers with it."""
+    for process in list(_aria2c_processes):
+        try:
+            process.kill()
+        except OSError:
+            pass
+    os._exit(1)
+
+def _download_worker_main(config: AIConfig, conn) -> None:
+    """Child process entry point: fetch the model files, reporting progress over the pipe."""
+    def report_progress(progress: int) -> None:
+        conn.send(("progress", progress))
+    
+    # A cancelled download is terminated, which would otherwise orphan aria2c.
+    # Windows terminates without a signal; aria2c's --stop-with-process covers that
+    signal.signal(signal.SIGTERM, _kill_aria2c_and_exit)
+    try:
+        ModelDownloader(config)._fetch_files(report_progress)
+        conn.send(("done", None))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {str(e)}"))
+    finally:
+        conn.close()
+
 class ModelDownloader:
     """Handles model downloading and initialization."""
     
     def __init__(self, config: AIConfig):
         self.config = config
-        self.model = None
-        self.tokenizer = None
         self._download_attempts = 0
         self._max_retries = 3
-        self._retry_delay = 5  # seconds
+        self._max_retry_delay = 30  # seconds, before jitter
+        self._cancel_event = threading.Event()
+        self._download_workers = int(os.getenv("HF_PARALLEL_DOWNLOADING_WORKERS", "8"))
+        # Verification results keyed by model path, valid while config.json's mtime and size are unchanged
+        self._verify_cache: Dict[str, tuple] = {}
+        # Result of the last is_model_installed() check, None once invalidated,
+        # and the model directory's mtime it was computed against
+        self._installed_cache: Optional[bool] = None
+        # Snapshot in the Hugging Face cache that check found, when the model
+        # directory itself holds no valid model
+        self._cached_snapshot: Optional[str] = None
+        self._installed_mtime: Optional[int] = None
+        # Called with the new installed state after a download or a deletion
+        self._installed_listeners: List[Callable[[bool], None]] = []
+    
+    def add_installed_listener(self, callback: Callable[[bool], None]) -> None:
+        """Register a callback for changes to whether the model is installed."""
+        self._installed_listeners.append(callback)
+    
+    def model_files_settled(self) -> bool:
+        """Check that the weight files are complete before a load reads them.
         
-        # Set up offload directory in user's home directory
-        home_dir = os.path.expanduser("~")
-        self.offload_dir = os.path.join(home_dir, ".ultimate_overlay", "offload")
-        self.config.offload_folder = self.offload_dir
+        While a download into the model directory is running, the sizes are
+        taken twice a moment apart to catch files still being written. Sizes
+        that differ from those recorded at verification send the model
+        through a full verification again.
+        """
+        model_path = self.config.model_path
+        sizes = _model_file_sizes(model_path)
+        with _active_downloads_lock:
+            downloading = model_path in _active_downloads
+        if downloading:
+            time.sleep(_SIZE_SETTLE_SECS)
+            if _model_file_sizes(model_path) != sizes:
+                logger.error(f"Model files in {model_path} are still being written")
+                return False
         
-        # Create offload directory with proper permissions
+        recorded = self._read_sentinel_data(model_path).get('weight_sizes')
+        if not isinstance(recorded, dict):
+            return True
+        changed = [name for name, size in recorded.items() if sizes.get(name) != size]
+        if not changed:
+            return True
+        
+        logger.warning(f"Model files changed size since verification: {', '.join(changed)}")
+        self._remove_sentinel(model_path)
+        self.invalidate_installed_cache()
+        verified, _ = self._verify_download(model_path, deep=True)
+        if not verified:
+            logger.error("Model files are invalid, download the model again")
+            self._notify_installed_changed(False)
+        return verified
+    
+    def invalidate_installed_cache(self) -> None:
+        """Make the next is_model_installed() call check the disk again."""
+        self._installed_cache = None
+        self._verify_cache.clear()
+    
+    def _notify_installed_changed(self, installed: bool) -> None:
+        """Tell the registered listeners the model's installed state changed."""
+        for callback in self._installed_listeners:
+            try:
+                callback(installed)
+            except Exception as e:
+                logger.error(f"Error in installed-state listener: {str(e)}")
+    
+    def _remove_invalid_files(self, path: str) -> None:
+        """Delete only the files that fail verification, keeping the rest for resuming."""
+        self._remove_sentinel(path)
+        self.invalidate_installed_cache()
         try:
-            os.makedirs(self.offload_dir, exist_ok=True)
-            # Test write permissions
-            test_file = os.path.join(self.offload_dir, "test.txt")
-            with open(test_file, "w") as f:
-                f.write("test")
-            os.remove(test_file)
-            logger.info(f"Offload directory created and verified at: {self.offload_dir}")
+            # Only the model's own files; hub download metadata and lock files stay
+            found = self._scan_model_dir(path)
+            names, _, invalid = self._model_files(found)
+            if self.config.backend == "llama_cpp":
+                gguf_path = find_gguf(path, self.config.gguf_file)
+                if gguf_path is not None:
+                    names, invalid = [os.path.basename(gguf_path)], []
+            for name in invalid + self._verify_files(names, found):
+                file_path = found[name][0]
+                logger.info(f"Removing invalid file: {file_path}")
+                os.remove(file_path)
         except Exception as e:
-            logger.warning(f"Could not create offload directory at {self.offload_dir}: {str(e)}")
-            # Fallback to system temp directory
-            import tempfile
-            self.offload_dir = os.path.join(tempfile.gettempdir(), "ultimate_overlay_offload")
-            self.config.offload_folder = self.offload_dir
-            os.makedirs(self.offload_dir, exist_ok=True)
-            logger.info(f"Using fallback offload directory at: {self.offload_dir}")
-    
-    def _cleanup_partial_download(self, path: str) -> None:
-        """Clean up any partial downloads."""
+            logger.warning(f"Error removing invalid files: {str(e)}")
+        self._notify_installed_changed(False)
+    
+    def _scan_model_dir(self, model_path: str) -> Dict[str, tuple]:
+        """Map each file name under model_path to its (path, size), first occurrence wins."""
+        found: Dict[str, tuple] = {}
+        pending = [model_path]
+        while pending:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        pending.append(entry.path)
+                    elif entry.name not in found:
+                        found[entry.name] = (entry.path, entry.stat().st_size)
+        return found
+    
+    @staticmethod
+    def _json_looks_complete(file_path: str, file_size: int) -> bool:
+        """Cheap truncation check: the file starts and ends with a JSON bracket."""
+        with open(file_path, 'rb') as f:
+            head = f.read(64).lstrip(b'\xef\xbb\xbf \t\r\n')
+            f.seek(max(0, file_size - 64))
+            tail = f.read().rstrip()
+        return head[:1] in (b'{', b'[') and tail[-1:] in (b'}', b']')
+    
+    @staticmethod
+    def _safetensors_size(file_path: str) -> Optional[int]:
+        """Size a .safetensors file should have according to its header, or None if unreadable.
+        
+        The header is an 8-byte length followed by JSON giving each tensor's
+        byte range, so a truncated or replaced file shows up without reading
+        the tensors.
+        """
         try:
-            if os.path.exists(path):
-                shutil.rmtree(path, ignore_errors=True)
-                time.sleep(1)  # Give filesystem time to clean up
-        except Exception as e:
-            logger.warning(f"Error cleaning up partial download: {str(e)}")
+            with open(file_path, 'rb') as f:
+                header_size = int.from_bytes(f.read(8), 'little')
+                if header_size > _SAFETENSORS_MAX_HEADER:
+                    return None
+                header = json.loads(f.read(header_size))
+            data_size = max((entry['data_offsets'][1] for name, entry in header.items()
+                             if name != '__metadata__'), default=0)
+            return 8 + header_size + data_size
+        except (OSError, ValueError, KeyError, TypeError, IndexError):
+            return None
+    
+    @staticmethod
+    def _parse_json_file(file_path: str, file_size: int) -> None:
+        """Parse a JSON file, raising ValueError if it is malformed.
+        
+        Small files are read into a reused buffer; large ones are streamed
+        through ijson when available so no document tree is built.
+        """
+        if ijson is not None and file_size > _STREAM_PARSE_THRESHOLD:
+            try:
+                with open(file_path, 'rb') as f:
+                    for _ in ijson.parse(f):
+                        pass
+            except ijson.JSONError as e:
+                raise ValueError(str(e)) from e
+            return
+        
+        buffer = getattr(_scratch, 'buffer', None)
+        if buffer is None:
+            buffer = _scratch.buffer = bytearray(_SCRATCH_SIZE)
+        with open(file_path, 'rb', buffering=0) as f:
+            n = f.readinto(buffer)
+            if n < len(buffer):
+                _loads_buffer(memoryview(buffer)[:n])
+            else:
+                f.seek(0)
+                _loads_buffer(f.read())
     
-    def _verify_file(self, file_path: str, expected_size: Optional[int] = None) -> bool:
-        """Verify a single file exists and has valid content."""
+    def _verify_file(self, file_path: str, expected_size: Optional[int] = None,
+                     file_size: Optional[int] = None, deep: bool = False) -> bool:
+        """Verify a single file exists and has valid content.
+        
+        file_size may be passed when the caller already stat'ed the file.
+        JSON files are only fully parsed when deep is set or the cheap
+        bracket check fails.
+        """
         try:
-            if not os.path.exists(file_path):
-                logger.error(f"File does not exist: {file_path}")
-                return False
+            if file_size is None:
+                try:
+                    file_size = os.stat(file_path).st_size
+                except FileNotFoundError:
+                    logger.error(f"File does not exist: {file_path}")
+                    return False
                 
             # Check file size
-            file_size = os.path.getsize(file_path)
             if file_size == 0:
                 logger.error(f"File is empty: {file_path}")
                 return False
@@ -76,12 +379,15 @@ class ModelDownloader:
                 logger.error(f"File size mismatch for {file_path}: expected {expected_size}, got {file_size}")
                 return False
             
+            if file_path.endswith('.safetensors') and self._safetensors_size(file_path) != file_size:
+                logger.error(f"Truncated or corrupt weight file: {file_path}")
+                return False
+            
             # For JSON files, verify they can be loaded
-            if file_path.endswith('.json'):
+            if file_path.endswith('.json') and (deep or not self._json_looks_complete(file_path, file_size)):
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        json.load(f)
-                except json.JSONDecodeError as e:
+                    self._parse_json_file(file_path, file_size)
+                except ValueError as e:
                     logger.error(f"Invalid JSON in {file_path}: {str(e)}")
                     return False
             
@@ -91,70 +397,246 @@ class ModelDownloader:
             logger.error(f"Error verifying file {file_path}: {str(e)}")
             return False
     
-    def _verify_download(self, model_path: str) -> bool:
-        """Verify that all required files are present and valid."""
-        required_files = [
-            'config.json',
-            'tokenizer.json',
-            'tokenizer_config.json',
-            'special_tokens_map.json',
-            'pytorch_model.bin',
-            'vocab.json',
-            'merges.txt'
-        ]
+    def _verify_download(self, model_path: str, deep: bool = False) -> Tuple[bool, List[str]]:
+        """Verify that all required files are present and valid.
         
+        Returns the result and the file listing built while checking, which is
+        empty when a remembered result is used. A successful result is
+        remembered, in memory and in a .verified file next to the model, until
+        config.json or a weight file changes; a deep check always runs in full.
+        """
         try:
-            # Check if directory exists
-            if not os.path.exists(model_path):
+            config_stat = os.stat(os.path.join(model_path, 'config.json'))
+            config_key = (config_stat.st_mtime_ns, config_stat.st_size)
+        except OSError:
+            config_key = None
+        key = (config_key, _model_file_sizes(model_path))
+        if not deep and config_key is not None:
+            if self._verify_cache.get(model_path) == (key, True):
+                return True, []
+            if self._read_sentinel(model_path) == key:
+                self._verify_cache[model_path] = (key, True)
+                return True, []
+        
+        result, listing = self._verify_download_files(model_path, deep)
+        if config_key is not None:
+            self._verify_cache[model_path] = (key, result)
+            if result:
+                self._write_sentinel(model_path, key)
+            else:
+                self._remove_sentinel(model_path)
+        return result, listing
+    
+    @staticmethod
+    def _read_sentinel_data(model_path: str) -> dict:
+        """Return the contents of the .verified file, or an empty dict."""
+        try:
+            with open(os.path.join(model_path, _SENTINEL_FILE), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+    
+    @staticmethod
+    def _read_sentinel(model_path: str) -> Optional[tuple]:
+        """Return the config.json (mtime_ns, size) and weight file sizes recorded by the last successful verification."""
+        data = ModelDownloader._read_sentinel_data(model_path)
+        try:
+            return ((data['config_mtime_ns'], data['config_size']), data['weight_sizes'])
+        except KeyError:
+            return None
+    
+    @staticmethod
+    def _write_sentinel(model_path: str, key: tuple) -> None:
+        """Record a successful verification so later runs can skip it."""
+        sentinel_path = os.path.join(model_path, _SENTINEL_FILE)
+        tmp_path = sentinel_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'config_mtime_ns': key[0][0],
+                    'config_size': key[0][1],
+                    'weight_sizes': key[1],
+                    'verified_at': time.time()
+                }, f)
+            # Replace in one step so a crash never leaves a truncated sentinel
+            os.replace(tmp_path, sentinel_path)
+        except OSError as e:
+            logger.warning(f"Could not write verification sentinel: {str(e)}")
+    
+    @staticmethod
+    def _remove_sentinel(model_path: str) -> None:
+        """Forget a recorded verification."""
+        try:
+            os.remove(os.path.join(model_path, _SENTINEL_FILE))
+        except OSError:
+            pass
+    
+    def _verify_download_files(self, model_path: str, deep: bool = False) -> Tuple[bool, List[str]]:
+        """Check every required file of the model directory."""
+        listing: List[str] = []
+        
+        try:
+            # One pass over the tree, reused for logging and for every required file
+            try:
+                found = self._scan_model_dir(model_path)
+            except FileNotFoundError:
                 logger.error(f"Model directory does not exist: {model_path}")
-                return False
+                return False, listing
+            listing = [file_path for file_path, _ in found.values()]
             
             # Log directory contents for debugging
             logger.info(f"Contents of {model_path}:")
-            for root, dirs, files in os.walk(model_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    size = os.path.getsize(file_path)
-                    logger.info(f"  {file_path} ({size} bytes)")
+            for file_path, size in found.values():
+                logger.info(f"  {file_path} ({size} bytes)")
             
-            # Check each required file
-            missing_files = []
-            invalid_files = []
+            # A GGUF file is self-contained for the llama.cpp backend
+            if self.config.backend == "llama_cpp":
+                gguf_path = find_gguf(model_path, self.config.gguf_file)
+                if gguf_path is not None:
+                    return self._verify_file(gguf_path), listing
             
-            for file in required_files:
-                # Search for the file in all subdirectories
-                found = False
-                for root, dirs, files in os.walk(model_path):
-                    if file in files:
-                        file_path = os.path.join(root, file)
-                        if self._verify_file(file_path):
-                            found = True
-                            break
-                
-                if not found:
-                    missing_files.append(file)
+            # Collect the files to check first, so they can be verified together
+            to_check, missing_files, invalid_files = self._model_files(found)
+            invalid_files.extend(self._verify_files(to_check, found, deep))
             
             if missing_files:
                 logger.error(f"Missing required files: {', '.join(missing_files)}")
-                return False
+                return False, listing
                 
             if invalid_files:
                 logger.error(f"Invalid files: {', '.join(invalid_files)}")
-                return False
+                return False, listing
             
             logger.info(f"Model verification successful at: {model_path}")
-            return True
+            return True, listing
             
         except Exception as e:
             logger.error(f"Error verifying download: {str(e)}")
-            return False
+            return False, listing
+    
+    def _model_files(self, found: Dict[str, tuple]) -> Tuple[List[str], List[str], List[str]]:
+        """Split the files a model needs into present, missing and unreadable ones.
+        
+        These are the required files, the first weight file found and, for a
+        sharded checkpoint, the shards its index lists.
+        """
+        missing_files = [file for file in _REQUIRED_FILES if file not in found]
+        present_files = [file for file in _REQUIRED_FILES if file in found]
+        invalid_files = []
+        
+        present_weights = [file for file in _WEIGHT_FILES if file in found]
+        if not present_weights:
+            missing_files.append(' or '.join(_WEIGHT_FILES))
+        else:
+            weights = present_weights[0]
+            present_files.append(weights)
+            if weights.endswith('.index.json'):
+                try:
+                    shards = self._read_shard_names(found[weights][0])
+                    missing_files.extend(shard for shard in shards if shard not in found)
+                    present_files.extend(shard for shard in shards if shard in found)
+                except ValueError:
+                    invalid_files.append(weights)
+        return present_files, missing_files, invalid_files
+    
+    @staticmethod
+    def _read_shard_names(index_path: str) -> List[str]:
+        """Return the shard file names listed in a sharded checkpoint's index file."""
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return sorted(set(json.load(f).get('weight_map', {}).values()))
+    
+    def _verify_files(self, names: List[str], found: Dict[str, tuple],
+                      deep: bool = False) -> List[str]:
+        """Verify the named files concurrently and return the ones that failed.
+        
+        The checks are file reads, so threads let the disk work on several at once.
+        """
+        if not names:
+            return []
+        with ThreadPoolExecutor(max_workers=min(8, len(names))) as executor:
+            results = list(executor.map(
+                lambda name: self._verify_file(found[name][0], file_size=found[name][1], deep=deep),
+                names
+            ))
+        return [name for name, ok in zip(names, results) if not ok]
+    
+    def _find_in_hf_cache(self) -> Optional[str]:
+        """Return the snapshot directory if the shared Hugging Face cache holds the whole model."""
+        try:
+            from huggingface_hub import try_to_load_from_cache
+        except ImportError:
+            return None
+        
+        def cached(filename: str) -> Optional[str]:
+            # Misses come back as None or the _CACHED_NO_EXIST marker
+            path = try_to_load_from_cache(self.config.model_name, filename)
+            return path if isinstance(path, str) else None
+        
+        config_path = cached('config.json')
+        if config_path is None or not all(cached(file) for file in _REQUIRED_FILES):
+            return None
+        
+        for weights in _WEIGHT_FILES:
+            weights_path = cached(weights)
+            if weights_path is None:
+                continue
+            if weights.endswith('.index.json'):
+                with open(weights_path, 'r', encoding='utf-8') as f:
+                    shards = set(json.load(f).get('weight_map', {}).values())
+                if not all(cached(shard) for shard in shards):
+                    continue
+            return os.path.dirname(config_path)
+        return None
     
     def is_model_installed(self) -> bool:
-        """Check if model is installed and valid."""
-        return self._verify_download(self.config.model_path)
+        """Check if model is installed and valid.
+        
+        The answer is cached until a download or deletion invalidates it, or
+        files are added to or removed from the model directory.
+        """
+        mtime = self._model_dir_mtime()
+        if self._installed_cache is None or mtime != self._installed_mtime:
+            self._installed_cache = self._check_model_installed()
+            self._installed_mtime = mtime
+        return self._installed_cache
+    
+    def _model_dir_mtime(self) -> Optional[int]:
+        """Modification time of the model directory, or None if it does not exist."""
+        try:
+            return os.stat(self.config.model_path).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _check_model_installed(self) -> bool:
+        """Check the model directory, then the Hugging Face cache, for a valid model."""
+        self._cached_snapshot = None
+        if self._verify_download(self.config.model_path)[0]:
+            return True
+        
+        # A complete copy in the shared Hugging Face cache works just as well;
+        # it is only read from, never verified in place or written to
+        snapshot_dir = self._find_in_hf_cache()
+        if snapshot_dir is None:
+            return False
+        logger.info(f"Using cached model snapshot at: {snapshot_dir}")
+        self._cached_snapshot = snapshot_dir
+        return True
+    
+    def resolved_model_path(self) -> str:
+        """Directory to load the model from: the model directory or a cached snapshot."""
+        if self.is_model_installed() and self._cached_snapshot is not None:
+            return self._cached_snapshot
+        return self.config.model_path
     
     def download_model(self, progress_callback: Optional[Callable[[int], None]] = None) -> bool:
         """Download and initialize the model with robust error handling."""
+        self._download_attempts = 0
+        self._cancel_event.clear()
+        self.invalidate_installed_cache()
+        model_path = self.config.model_path
+        with _active_downloads_lock:
+            _active_downloads.add(model_path)
         try:
             if self.is_model_installed():
                 logger.info("Model is already installed and verified")
@@ -163,73 +645,58 @@ class ModelDownloader:
                 return True
             
             logger.info(f"Starting model download to: {self.config.model_path}")
+            if not _HF_TRANSFER_AVAILABLE:
+                logger.warning("hf_transfer is not installed, downloads will be slower. "
+                               "Install it with: pip install hf_transfer")
             
             # Create model directory if it doesn't exist
             os.makedirs(self.config.model_path, exist_ok=True)
             
-            # Create progress bar
-            progress_bar = tqdm(total=100, desc="Downloading model")
-            
-            def update_progress(progress: int):
-                try:
-                    progress_bar.update(progress - progress_bar.n)
-                    if progress_callback:
-                        progress_callback(progress)
-                except Exception as e:
-                    logger.warning(f"Error updating progress: {str(e)}")
-            
             # Download model files with retry logic
             while self._download_attempts < self._max_retries:
                 try:
-                    # Clean up any partial downloads
-                    self._cleanup_partial_download(self.config.model_path)
+                    if self._cancel_event.is_set():
+                        raise DownloadCancelled()
+                    
+                    # Files from earlier attempts are kept; snapshot_download
+                    # skips complete ones and resumes the rest
                     os.makedirs(self.config.model_path, exist_ok=True)
                     
-                    # Download model files with explicit patterns
-                    snapshot_download(
-                        repo_id=self.config.model_name,
-                        local_dir=self.config.model_path,
-                        tqdm_class=tqdm,
-                        ignore_patterns=[
-                            "*.msgpack", "*.h5", "*.safetensors",
-                            "*.mlpackage", "*.onnx", "*.tflite",
-                            "*.bin.index.json"
-                        ],
-                        allow_patterns=[
-                            "*.json",
-                            "*.bin",
-                            "*.txt",
-                            "*.model",
-                            "*.vocab",
-                            "*.merges",
-                            "*.config"
-                        ],
-                        token=None,  # Use anonymous access
-                        local_files_only=False,  # Force download from hub
-                        resume_download=True  # Allow resuming interrupted downloads
-                    )
+                    self._fetch_files_in_worker(progress_callback)
                     
-                    # Update progress to 100% after download
-                    update_progress(100)
+                    self._ensure_fast_tokenizer()
                     
-                    # Verify download and log any missing files
-                    if not self._verify_download(self.config.model_path):
+                    # Fully verify the fresh download and log any missing files
+                    verified, listing = self._verify_download(self.config.model_path, deep=True)
+                    if not verified:
                         logger.error("Model verification failed after download")
                         # List all files in the directory
                         logger.info("Contents of model directory:")
-                        for root, dirs, files in os.walk(self.config.model_path):
-                            for file in files:
-                                logger.info(f"  {os.path.join(root, file)}")
+                        for file_path in listing:
+                            logger.info(f"  {file_path}")
+                        # Drop broken files so the next attempt downloads them again
+                        self._remove_invalid_files(self.config.model_path)
                         return False
                     
                     logger.info("Model downloaded and verified successfully")
-                    progress_bar.close()
+                    # The load usually follows right away; start reading the weights
+                    # back in case writing them pushed their pages out of the cache
+                    gguf_path = find_gguf(self.config.model_path, self.config.gguf_file)
+                    _advise_willneed([gguf_path] if gguf_path else weight_files(self.config.model_path))
+                    if progress_callback:
+                        progress_callback(100)
+                    self._installed_cache = True
+                    self._installed_mtime = self._model_dir_mtime()
+                    self._notify_installed_changed(True)
                     return True
+                
+                except DownloadCancelled:
+                    # Keep the files fetched so far; a later download resumes them
+                    logger.info("Model download cancelled")
+                    return False
                     
                 except Exception as e:
-                    logger.error(f"Download attempt {self._download_attempts + 1} failed: {str(e)}")
-                    import traceback
-                    logger.error(f"Traceback: {traceback.format_exc()}")
+                    logger.exception(f"Download attempt {self._download_attempts + 1} failed: {str(e)}")
                     
                     # Check if we have partial files
                     if os.path.exists(self.config.model_path):
@@ -237,166 +704,224 @@ class ModelDownloader:
                         files = os.listdir(self.config.model_path)
                         if files:
                             logger.info(f"Found {len(files)} files in partial download: {files}")
+                        self._remove_invalid_files(self.config.model_path)
                 
                 self._download_attempts += 1
                 if self._download_attempts < self._max_retries:
-                    logger.info(f"Retrying download in {self._retry_delay} seconds...")
-                    time.sleep(self._retry_delay)
+                    # Exponential backoff with jitter
+                    delay = min(self._max_retry_delay, 2 ** self._download_attempts) + random.random()
+                    logger.info(f"Retrying download in {delay:.1f} seconds...")
+                    # Wait on the cancel event so cancelling doesn't sit out the backoff
+                    if self._cancel_event.wait(delay):
+                        logger.info("Model download cancelled")
+                        return False
             
             logger.error("All download attempts failed")
             return False
             
         except Exception as e:
-            logger.error(f"Error in download process: {str(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.exception(f"Error in download process: {str(e)}")
             return False
+        
         finally:
-            try:
-                progress_bar.close()
-            except:
-                pass
-    
-    def load_model(self) -> bool:
-        """Load the model from disk with robust error handling."""
-        if not self.is_model_installed():
-            logger.error("Model not installed or invalid, cannot load")
-            return False
-            
+            with _active_downloads_lock:
+                _active_downloads.discard(model_path)
+    
+    def cancel_download(self) -> None:
+        """Stop a running download_model() call, interrupting the file being transferred."""
+        self._cancel_event.set()
+    
+    def _fetch_files_in_worker(self, progress_callback: Optional[Callable[[int], None]] = None) -> None:
+        """Run _fetch_files in a child process that cancel_download() can stop mid-file.
+        
+        The hub client only reports progress once a file is complete, so a
+        large weight file cannot be interrupted from inside this process.
+        Terminating the child leaves the .incomplete files behind, and the
+        next download resumes them.
+        """
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        process = ctx.Process(
+            target=_download_worker_main,
+            args=(self.config, child_conn),
+            name="model-download",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
         try:
-            # Clean up any existing model and memory
-            self._cleanup_model()
-            
-            logger.info("Loading tokenizer...")
-            try:
-                # First try loading with default settings
-                self.tokenizer = AutoTokenizer.from_pretrained(
-                    self.config.model_path,
-                    use_fast=True,
-                    local_files_only=True,
-                    model_max_length=self.config.context_window
-                )
-                logger.info("Tokenizer loaded successfully")
-            except Exception as e:
-                logger.error(f"Failed to load tokenizer with default settings: {str(e)}")
-                # Try loading with legacy settings
+            while True:
+                if self._cancel_event.is_set():
+                    raise DownloadCancelled()
+                if not parent_conn.poll(_CANCEL_POLL_SECS):
+                    continue
                 try:
-                    self.tokenizer = AutoTokenizer.from_pretrained(
-                        self.config.model_path,
-                        use_fast=False,  # Use legacy tokenizer
-                        local_files_only=True,
-                        model_max_length=self.config.context_window,
-                        trust_remote_code=True
-                    )
-                    logger.info("Tokenizer loaded successfully with legacy settings")
-                except Exception as e2:
-                    logger.error(f"Failed to load tokenizer with legacy settings: {str(e2)}")
-                    return False
-            
-            logger.info("Loading model with minimal settings...")
-            
-            # Basic configuration without offloading
-            load_args = {
-                "device_map": "cpu",
-                "low_cpu_mem_usage": True,
-                "torch_dtype": torch.float32,
-                "local_files_only": True,
-                "use_cache": False,
-                "offload_folder": None,  # Disable offloading
-                "max_memory": {0: "512MB"},  # Limit memory usage
-                "load_in_8bit": False,  # Disable 8-bit quantization
-                "load_in_4bit": False,  # Disable 4-bit quantization
-                "quantization_config": None,  # Disable quantization
-                "trust_remote_code": True  # Allow custom model code
-            }
-            
-            try:
-                logger.info("Attempting to load model with configuration:")
-                for key, value in load_args.items():
-                    logger.info(f"  {key}: {value}")
-                
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    self.config.model_path,
-                    **load_args
-                )
-                logger.info("Model loaded successfully")
-                return True
-            except Exception as e:
-                logger.error(f"Error loading model: {str(e)}")
-                logger.error(f"Error type: {type(e).__name__}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
-                self._cleanup_model()
-                return False
+                    kind, value = parent_conn.recv()
+                except EOFError:
+                    raise RuntimeError(f"Download process exited with code {process.exitcode}")
+                if kind == "progress":
+                    if progress_callback:
+                        try:
+                            progress_callback(value)
+                        except Exception as e:
+                            logger.warning(f"Error updating progress: {str(e)}")
+                elif kind == "error":
+                    raise RuntimeError(value)
+                else:
+                    return
+        finally:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            parent_conn.close()
+    
+    def _fetch_files(self, progress_callback: Optional[Callable[[int], None]] = None) -> None:
+        """Download the model files into the model directory."""
+        from huggingface_hub import snapshot_download
+        progress_tqdm = _progress_tqdm(progress_callback)
+        
+        # Fetch large weight files ahead, in parallel where possible
+        self._prefetch_weights()
+        
+        # Download model files with explicit patterns
+        snapshot_download(
+            repo_id=self.config.model_name,
+            local_dir=self.config.model_path,
+            tqdm_class=progress_tqdm,
+            ignore_patterns=[
+                "*.msgpack", "*.h5",
+                "*.mlpackage", "*.onnx", "*.tflite",
+                "*.bin.index.json"
+            ],
+            allow_patterns=[
+                "*.json",
+                "*.safetensors",
+                "*.txt",
+                "*.model",
+                "*.vocab",
+                "*.merges",
+                "*.config"
+            ] + ([self.config.gguf_file] if self.config.backend == "llama_cpp" and self.config.gguf_file else []),
+            max_workers=self._download_workers,  # Fetch files concurrently
+            token=None,  # Use anonymous access
+            local_files_only=False,  # Force download from hub
+            resume_download=True  # Allow resuming interrupted downloads
+        )
+        
+        # Fall back to pickled weights for repos without safetensors
+        has_gguf = self.config.backend == "llama_cpp" and find_gguf(self.config.model_path, self.config.gguf_file)
+        if not has_safetensors(self.config.model_path) and not has_gguf:
+            logger.info("No safetensors weights found, downloading pytorch_model.bin")
+            snapshot_download(
+                repo_id=self.config.model_name,
+                local_dir=self.config.model_path,
+                tqdm_class=progress_tqdm,
+                allow_patterns=["*.bin"],
+                max_workers=self._download_workers,
+                token=None,
+                local_files_only=False,
+                resume_download=True
+            )
+    
+    def _ensure_fast_tokenizer(self) -> None:
+        """Write tokenizer.json if the repository only ships the slow tokenizer files."""
+        if os.path.exists(os.path.join(self.config.model_path, 'tokenizer.json')):
+            return
+        try:
+            from transformers import AutoTokenizer
             
+            logger.info("Converting tokenizer to the fast format")
+            tokenizer = AutoTokenizer.from_pretrained(
+                self.config.model_path,
+                use_fast=True,
+                local_files_only=True
+            )
+            tokenizer.save_pretrained(self.config.model_path)
         except Exception as e:
-            logger.error(f"Error in model loading process: {str(e)}")
-            logger.error(f"Error type: {type(e).__name__}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            self._cleanup_model()
-            return False
+            logger.warning(f"Failed to convert tokenizer: {str(e)}")
     
-    def _cleanup_model(self) -> None:
-        """Clean up model resources and memory."""
+    def _prefetch_weights(self) -> None:
+        """Download the safetensors weights ahead of snapshot_download.
+        
+        Shards of a sharded checkpoint are fetched concurrently. A single
+        weight file is only fetched here when aria2c is available, since
+        otherwise snapshot_download does the same. snapshot_download then
+        skips whatever was fetched here.
+        """
+        from huggingface_hub import hf_hub_download
+        from huggingface_hub.utils import EntryNotFoundError
+        
         try:
-            logger.info("Starting model cleanup...")
-            
-            # Clear model and tokenizer
-            if self.model is not None:
-                logger.info("Cleaning up model...")
-                if hasattr(self.model, 'to'):
-                    self.model.to('cpu')
-                del self.model
-                self.model = None
-                logger.info("Model cleaned up")
-            
-            if self.tokenizer is not None:
-                logger.info("Cleaning up tokenizer...")
-                del self.tokenizer
-                self.tokenizer = None
-                logger.info("Tokenizer cleaned up")
-            
-            # Clean up offload directory
-            if self.offload_dir and os.path.exists(self.offload_dir):
-                logger.info(f"Cleaning up offload directory: {self.offload_dir}")
+            index_path = hf_hub_download(
+                repo_id=self.config.model_name,
+                filename='model.safetensors.index.json',
+                local_dir=self.config.model_path
+            )
+        except EntryNotFoundError:
+            if shutil.which("aria2c") is not None:
                 try:
-                    # Remove files one by one to avoid permission issues
-                    for root, dirs, files in os.walk(self.offload_dir, topdown=False):
-                        for name in files:
-                            try:
-                                file_path = os.path.join(root, name)
-                                os.remove(file_path)
-                                logger.debug(f"Removed file: {file_path}")
-                            except Exception as e:
-                                logger.warning(f"Failed to remove file {name}: {str(e)}")
-                        for name in dirs:
-                            try:
-                                dir_path = os.path.join(root, name)
-                                os.rmdir(dir_path)
-                                logger.debug(f"Removed directory: {dir_path}")
-                            except Exception as e:
-                                logger.warning(f"Failed to remove directory {name}: {str(e)}")
-                    # Recreate the directory
-                    os.makedirs(self.offload_dir, exist_ok=True)
-                    logger.info("Offload directory cleaned up")
-                except Exception as e:
-                    logger.warning(f"Failed to clean up offload directory: {str(e)}")
-            
-            # Force garbage collection
-            logger.info("Running garbage collection...")
-            import gc
-            gc.collect()
-            
-            # Clear CUDA cache if available
-            if torch.cuda.is_available():
-                logger.info("Clearing CUDA cache...")
-                torch.cuda.empty_cache()
-            
-            logger.info("Cleanup completed")
-            
-        except Exception as e:
-            logger.error(f"Error during model cleanup: {str(e)}")
-            logger.error(f"Error type: {type(e).__name__}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}") 
\ No newline at end of file
+                    self._download_weight_file('model.safetensors')
+                except EntryNotFoundError:
+                    pass
+            return
+        
+        shards = self._read_shard_names(index_path)
+        if not shards:
+            return
+        
+        logger.info(f"Downloading {len(shards)} weight shards in parallel")
+        # huggingface_hub keeps a pooled HTTP session per thread, so each worker
+        # reuses its connections across shards
+        with ThreadPoolExecutor(max_workers=min(self._download_workers, len(shards))) as executor:
+            list(executor.map(self._download_weight_file, shards))
+    
+    def _download_weight_file(self, filename: str) -> None:
+        """Download one weight file, over several connections with aria2c when it is installed."""
+        from huggingface_hub import hf_hub_download
+        
+        aria2c = shutil.which("aria2c")
+        if aria2c is not None:
+            try:
+                self._download_with_aria2c(aria2c, filename)
+                return
+            except subprocess.CalledProcessError as e:
+                logger.warning(f"aria2c could not download {filename}, using the hub client: {str(e)}")
+        
+        hf_hub_download(
+            repo_id=self.config.model_name,
+            filename=filename,
+            local_dir=self.config.model_path
+        )
+    
+    def _download_with_aria2c(self, aria2c: str, filename: str) -> None:
+        """Fetch a file as 8 concurrent byte ranges and check it against the hub's sha256."""
+        from huggingface_hub import get_hf_file_metadata, hf_hub_url
+        
+        # Resolves the CDN location and raises EntryNotFoundError for missing files
+        metadata = get_hf_file_metadata(hf_hub_url(self.config.model_name, filename))
+        command = [
+            aria2c,
+            "--split=8",
+            "--max-connection-per-server=8",
+            "--continue=true",
+            "--allow-overwrite=true",
+            "--quiet=true",
+            f"--dir={self.config.model_path}",
+            f"--out={filename}",
+            # Exit if this process dies without killing aria2c first
+            f"--stop-with-process={os.getpid()}"
+        ]
+        # The ETag of LFS files is their sha256
+        if metadata.etag and _SHA256_RE.fullmatch(metadata.etag):
+            command.append(f"--checksum=sha-256={metadata.etag}")
+        command.append(metadata.location)
+        
+        logger.info(f"Downloading {filename} with aria2c")
+        process = subprocess.Popen(command)
+        _aria2c_processes.add(process)
+        try:
+            returncode = process.wait()
+        finally:
+            _aria2c_processes.discard(process)
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, command)
\ No newline at end of file
@@ -3,20 +3,160 @@ Model manager for handling AI model loading and unloading.
 """
 import logging
 import threading
-from typing import Optional, Dict, Any
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Iterator
+from collections import OrderedDict
+from transformers import (
+    AutoModelForCausalLM, AutoTokenizer, TextIteratorStreamer, DynamicCache,
+    StoppingCriteria, StoppingCriteriaList
+)
 from The_Ultimate_Overlay_App.ai.config import AIConfig
+from The_Ultimate_Overlay_App.ai.batcher import MicroBatcher
+from The_Ultimate_Overlay_App.ai.model_downloader import ModelDownloader, has_safetensors, weight_files
+from The_Ultimate_Overlay_App.ai.llama_backend import find_gguf, load_llama
+from The_Ultimate_Overlay_App.ai.inference_worker import InferenceWorker
+import copy
 import torch
 import gc
+import mmap
 import os
 import shutil
 
 logger = logging.getLogger(__name__)
 
+# Batch sizes the micro-batcher may use; config.batch_size is rounded down to one of these
+_BATCH_SIZE_CANDIDATES = (1, 2, 4, 8)
+
+# Max distinct prompt prefixes whose KV cache is kept around
+_PREFIX_CACHE_SIZE = 32
+
+# Size of each read when prefetching weight files; a multiple of the mmap granularity
+_PREFETCH_CHUNK_SIZE = 8 << 20
+
+# Linux can fault a whole mapping into the page cache in one call, without copying it out
+_MAP_POPULATE = getattr(mmap, "MAP_POPULATE", None)
+
+def nf4_quantization_config():
+    """Build the bitsandbytes 4-bit NF4 config, raising if 4-bit loading is unavailable.
+    
+    The bitsandbytes 4-bit kernels need a CUDA device.
+    """
+    from transformers import BitsAndBytesConfig
+    import bitsandbytes  # noqa: F401
+    if not torch.cuda.is_available():
+        raise RuntimeError("CUDA is not available")
+    return BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type="nf4",
+        bnb_4bit_compute_dtype=torch.bfloat16,
+        bnb_4bit_use_double_quant=True
+    )
+
+def _quantize_int8(model: torch.nn.Module) -> torch.nn.Module:
+    """Apply int8 dynamic quantization to the model's linear layers.
+    
+    GPT-2 style models implement their projections as transformers' Conv1D,
+    which dynamic quantization does not recognise, so those are first swapped
+    for equivalent nn.Linear layers.
+    """
+    from transformers.pytorch_utils import Conv1D
+    
+    for module in list(model.modules()):
+        for name, child in module.named_children():
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(module, name, linear)
+    
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def _optimize_with_ipex(model: torch.nn.Module, dtype: torch.dtype) -> torch.nn.Module:
+    """Apply Intel Extension for PyTorch kernel optimizations when it is installed."""
+    try:
+        import intel_extension_for_pytorch as ipex
+    except ImportError:
+        return model
+    
+    try:
+        model = ipex.optimize(model, dtype=dtype, inplace=True)
+        logger.info("Applied Intel Extension for PyTorch optimizations")
+    except Exception as e:
+        logger.warning(f"Failed to optimize model with IPEX: {str(e)}")
+    return model
+
+def _prefetch_weights(paths: List[str], workers: int) -> None:
+    """Read the weight files into the page cache in parallel chunks.
+    
+    The loader then reads them from memory; a single sequential reader
+    cannot keep a fast SSD busy on its own.
+    """
+    if workers <= 1 or not (_MAP_POPULATE or hasattr(os, "pread")):
+        return
+    
+    local = threading.local()
+    
+    def _read(chunk: Tuple[int, int, int]) -> None:
+        fd, offset, length = chunk
+        if _MAP_POPULATE:
+            with mmap.mmap(fd, length, flags=mmap.MAP_PRIVATE | _MAP_POPULATE,
+                           prot=mmap.PROT_READ, offset=offset):
+                pass
+        elif hasattr(os, "preadv"):
+            # Reuse one buffer per thread instead of allocating every chunk
+            if not hasattr(local, "buf"):
+                local.buf = bytearray(_PREFETCH_CHUNK_SIZE)
+            os.preadv(fd, [local.buf], offset)
+        else:
+            os.pread(fd, _PREFETCH_CHUNK_SIZE, offset)
+    
+    fds = []
+    try:
+        chunks = []
+        for path in paths:
+            fd = os.open(path, os.O_RDONLY)
+            fds.append(fd)
+            size = os.fstat(fd).st_size
+            chunks.extend(
+                (fd, offset, min(_PREFETCH_CHUNK_SIZE, size - offset))
+                for offset in range(0, size, _PREFETCH_CHUNK_SIZE)
+            )
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_read, chunks))
+    except (OSError, ValueError) as e:
+        logger.debug(f"Weight prefetch stopped: {str(e)}")
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+def _evict_from_page_cache(paths: List[str]) -> None:
+    """Ask the kernel to drop the files' cached pages; pages the model still maps are kept."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.debug(f"Could not evict {path} from the page cache: {str(e)}")
+
+class _StopOnEvent(StoppingCriteria):
+    """Ends generation once the event is set."""
+    
+    def __init__(self, event: threading.Event):
+        self._event = event
+    
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor, **kwargs) -> torch.Tensor:
+        return torch.full((input_ids.shape[0],), self._event.is_set(), dtype=torch.bool, device=input_ids.device)
+
 class ModelManager:
     """Manages the lifecycle of the AI model."""
     
-    def __init__(self, config: AIConfig):
+    def __init__(self, config: AIConfig, downloader: Optional[ModelDownloader] = None):
         self.config = config
         self.model = None
         self.tokenizer = None
@@ -24,103 +164,140 @@ class ModelManager:
         self._lock = threading.Lock()
         self._loading_progress = 0
         
-        # Set up offload directory in user's home directory
-        home_dir = os.path.expanduser("~")
-        self._offload_dir = os.path.join(home_dir, ".ultimate_overlay", "offload")
-        self.config.offload_folder = self._offload_dir
+        # A paused manager keeps its model resident but refuses completions
+        self._paused = False
         
-        # Create offload directory with proper permissions
-        try:
-            os.makedirs(self._offload_dir, exist_ok=True)
-            # Test write permissions
-            test_file = os.path.join(self._offload_dir, "test.txt")
-            with open(test_file, "w") as f:
-                f.write("test")
-            os.remove(test_file)
-            logger.info(f"Offload directory created and verified at: {self._offload_dir}")
-        except Exception as e:
-            logger.warning(f"Could not create offload directory at {self._offload_dir}: {str(e)}")
-            # Fallback to system temp directory
-            import tempfile
-            self._offload_dir = os.path.join(tempfile.gettempdir(), "ultimate_overlay_offload")
-            self.config.offload_folder = self._offload_dir
-            os.makedirs(self._offload_dir, exist_ok=True)
-            logger.info(f"Using fallback offload directory at: {self._offload_dir}")
+        # llama.cpp model when config.backend is "llama_cpp"; it tokenizes
+        # internally and is not safe to call from several threads at once
+        self._llama = None
+        self._llama_lock = threading.Lock()
+        
+        # Child process holding the model when config.inference_process is set;
+        # completions are forwarded to it instead of running here
+        self._worker: Optional[InferenceWorker] = None
+        
+        # Reusable single-prompt input buffers sized to the context window; each
+        # call copies its tokens into a leading slice instead of allocating.
+        # They are moved to the model's device once it is loaded
+        self._device = torch.device("cpu")
+        self._input_buf = torch.zeros((1, config.context_window), dtype=torch.long)
+        self._mask_buf = torch.ones((1, config.context_window), dtype=torch.long)
+        self._input_lock = threading.Lock()
+        
+        # Prefilled KV caches of recurring prompt prefixes, least recently used first
+        self._prefix_cache: "OrderedDict[str, Tuple[torch.Tensor, Any]]" = OrderedDict()
+        self._prefix_lock = threading.Lock()
+        
+        # Group concurrent completion requests into batched generate calls
+        max_batch = max(c for c in _BATCH_SIZE_CANDIDATES if c <= max(1, config.batch_size))
+        self._batcher: Optional[MicroBatcher] = None
+        if max_batch > 1 and config.batch_window_ms > 0:
+            self._batcher = MicroBatcher(self._generate_batch, max_batch, config.batch_window_ms)
         
-    def _cleanup_memory(self):
+        # Disk offload directory, only set once a load actually offloads
+        self._offload_dir: Optional[str] = None
+        # Directory the current model was loaded from; a cached snapshot when
+        # the model directory itself holds no model
+        self._model_path: Optional[str] = None
+        # Shared with the UI when given, so a failed pre-load check reaches its listeners
+        self._downloader = downloader
+    
+    def _cleanup_memory(self, release_cuda: bool = False):
         """Clean up memory and temporary files."""
         # Clear Python garbage collector
         gc.collect()
         
-        # Clear CUDA cache if available
-        if torch.cuda.is_available():
+        # Only return cached CUDA blocks when CUDA was actually used; this is
+        # expensive and pointless right before a load
+        if release_cuda and torch.cuda.is_initialized():
             torch.cuda.empty_cache()
         
         # Clean up offload directory
         if self._offload_dir and os.path.exists(self._offload_dir):
             logger.info(f"Cleaning up offload directory: {self._offload_dir}")
+            shutil.rmtree(self._offload_dir, ignore_errors=True)
             try:
-                # Remove files one by one to avoid permission issues
-                for root, dirs, files in os.walk(self._offload_dir, topdown=False):
-                    for name in files:
-                        try:
-                            file_path = os.path.join(root, name)
-                            os.remove(file_path)
-                            logger.debug(f"Removed file: {file_path}")
-                        except Exception as e:
-                            logger.warning(f"Failed to remove file {name}: {str(e)}")
-                    for name in dirs:
-                        try:
-                            dir_path = os.path.join(root, name)
-                            os.rmdir(dir_path)
-                            logger.debug(f"Removed directory: {dir_path}")
-                        except Exception as e:
-                            logger.warning(f"Failed to remove directory {name}: {str(e)}")
-                # Recreate the directory
                 os.makedirs(self._offload_dir, exist_ok=True)
-                logger.info("Offload directory cleaned up")
             except Exception as e:
-                logger.warning(f"Failed to clean up offload directory: {str(e)}")
+                logger.warning(f"Failed to recreate offload directory: {str(e)}")
+    
+    def _needs_offload(self) -> bool:
+        """Check whether the model's weights would not fit in the available RAM."""
+        try:
+            import psutil
+            available = psutil.virtual_memory().available
+        except Exception as e:
+            logger.warning(f"Error detecting RAM: {str(e)}")
+            return False
         
-        # Force garbage collection again
-        gc.collect()
+        weight_bytes = sum(os.path.getsize(path) for path in weight_files(self._model_path))
+        return available < weight_bytes * 1.2
     
-    def load_model(self):
-        """Load the model in a background thread."""
-        if self._loading or self.model is not None:
-            return
+    def load_model(self) -> bool:
+        """Load the model on the calling thread and return whether it is available.
+        
+        Returns False without waiting when another thread is already loading.
+        """
+        if self.model is not None or self._llama is not None or self._worker is not None:
+            return True
             
         with self._lock:
+            if self._loading:
+                return False
             self._loading = True
             self._loading_progress = 0
             
         def _load():
             try:
-                logger.info(f"Loading model from {self.config.model_path}")
                 self._loading_progress = 10
                 
+                # A truncated weight file fails deep inside the loader with a cryptic error
+                downloader = self._downloader or ModelDownloader(self.config)
+                if not downloader.model_files_settled():
+                    return False
+                self._model_path = downloader.resolved_model_path()
+                logger.info(f"Loading model from {self._model_path}")
+                
                 # Clean up memory before loading
                 self._cleanup_memory()
                 
-                # Load tokenizer first with fallback options
-                try:
-                    self.tokenizer = AutoTokenizer.from_pretrained(
-                        self.config.model_path,
-                        use_fast=True,
-                        local_files_only=True,
-                        model_max_length=self.config.context_window,
-                        trust_remote_code=True
-                    )
-                except Exception as e:
-                    logger.warning(f"Failed to load tokenizer with fast mode: {str(e)}")
-                    # Try with legacy mode
-                    self.tokenizer = AutoTokenizer.from_pretrained(
-                        self.config.model_path,
-                        use_fast=False,
-                        local_files_only=True,
-                        model_max_length=self.config.context_window,
-                        trust_remote_code=True
-                    )
+                if self.config.inference_process:
+                    worker = InferenceWorker(self.config)
+                    if worker.start():
+                        self._worker = worker
+                        self._loading_progress = 100
+                        logger.info("Model loaded successfully in inference worker process")
+                        return True
+                    logger.warning("Inference worker unavailable, loading the model in-process")
+                
+                if self.config.backend == "llama_cpp":
+                    # llama.cpp maps the GGUF file itself, so a warm page cache makes its load near-instant
+                    gguf_path = find_gguf(self._model_path, self.config.gguf_file)
+                    if gguf_path is not None:
+                        _prefetch_weights([gguf_path], self.config.load_parallelism)
+                    self._llama = load_llama(self.config, self._model_path)
+                    if self._llama is not None:
+                        self._loading_progress = 100
+                        logger.info("Model loaded successfully with llama.cpp")
+                        return True
+                    logger.warning("llama.cpp backend unavailable, falling back to transformers")
+                
+                # Load the fast tokenizer first; tokenizer.json is written at
+                # install time, so a failure here is a real error rather than a
+                # reason to fall back to the much slower Python tokenizer
+                self.tokenizer = AutoTokenizer.from_pretrained(
+                    self._model_path,
+                    use_fast=True,
+                    local_files_only=True,
+                    model_max_length=self.config.context_window,
+                    trust_remote_code=True
+                )
+                
+                # Left padding keeps every prompt's last token adjacent to its
+                # generated text when requests are batched
+                self.tokenizer.padding_side = "left"
+                if self.tokenizer.pad_token is None:
+                    self.tokenizer.pad_token = self.tokenizer.eos_token
                 
                 self._loading_progress = 30
                 
@@ -128,42 +305,118 @@ class ModelManager:
                 load_args = {
                     "device_map": "cpu",
                     "low_cpu_mem_usage": self.config.low_cpu_mem_usage,
-                    "torch_dtype": torch.float32,
                     "local_files_only": True,
-                    "use_cache": False,
-                    "offload_folder": self.config.offload_folder,
-                    "max_memory": self.config.max_memory,
-                    "load_in_8bit": False,
-                    "load_in_4bit": False,
-                    "quantization_config": None,
                     "trust_remote_code": True
                 }
                 
+                quantization = self.config.quantization
+                if quantization == "4bit":
+                    try:
+                        load_args["quantization_config"] = nf4_quantization_config()
+                        load_args["device_map"] = "auto"
+                    except Exception as e:
+                        logger.warning(f"4-bit quantization unavailable, using int8: {str(e)}")
+                        quantization = "int8"
+                
+                # Dynamic int8 quantization works on float32 weights only
+                if quantization == "int8":
+                    load_args["torch_dtype"] = torch.float32
+                elif quantization == "4bit":
+                    load_args["torch_dtype"] = torch.bfloat16
+                else:
+                    load_args["torch_dtype"] = getattr(torch, self.config.resolved_torch_dtype)
+                
+                # Offload weights to disk only when they will not fit in RAM
+                if quantization != "4bit" and self._needs_offload():
+                    self._offload_dir = self.config.offload_folder
+                    logger.info(f"Not enough free RAM, offloading weights to {self._offload_dir}")
+                    load_args["device_map"] = "auto"
+                    load_args["offload_folder"] = self._offload_dir
+                    load_args["max_memory"] = self.config.max_memory
+                else:
+                    # Only worth it when the files fit in RAM alongside the model
+                    _prefetch_weights(weight_files(self._model_path), self.config.load_parallelism)
+                
+                # safetensors weights are memory-mapped instead of unpickled
+                if has_safetensors(self._model_path):
+                    load_args["use_safetensors"] = True
+                
                 logger.info("Loading model with configuration:")
                 for key, value in load_args.items():
                     logger.info(f"  {key}: {value}")
                 
                 self.model = AutoModelForCausalLM.from_pretrained(
-                    self.config.model_path,
+                    self._model_path,
                     **load_args
                 )
                 
                 # Set model to evaluation mode
                 self.model.eval()
                 
+                # 4-bit models are placed on the GPU; inputs have to follow them
+                device = self.model.device
+                if device.type != "meta" and device != self._device:
+                    with self._input_lock:
+                        self._device = device
+                        self._input_buf = self._input_buf.to(device)
+                        self._mask_buf = self._mask_buf.to(device)
+                
+                if quantization == "int8":
+                    try:
+                        self.model = _quantize_int8(self.model)
+                        logger.info("Applied int8 dynamic quantization")
+                    except Exception as e:
+                        logger.warning(f"Failed to quantize model to int8: {str(e)}")
+                elif quantization == "none":
+                    self.model = _optimize_with_ipex(self.model, load_args["torch_dtype"])
+                
+                # generate() calls the module itself, so compile forward rather than
+                # wrapping the model; compilation happens on the warmup pass below
+                eager_forward = self.model.forward
+                if self.config.compile_model:
+                    try:
+                        self.model.forward = torch.compile(eager_forward, dynamic=True)
+                    except Exception as e:
+                        logger.warning(f"Failed to compile model: {str(e)}")
+                
+                # Set the thread counts once rather than on every generate; the
+                # inter-op pool can only be sized before torch first uses it
+                try:
+                    torch.set_num_threads(max(1, self.config.num_threads))
+                    torch.set_num_interop_threads(1)
+                except RuntimeError as e:
+                    logger.debug(f"Could not set torch thread counts: {str(e)}")
+                
+                # Warm up with a full-context forward pass so weights are paged in and
+                # activation buffers allocated before the first real completion
+                try:
+                    warmup_inputs = self.tokenizer(
+                        "warmup",
+                        return_tensors="pt",
+                        padding="max_length",
+                        max_length=self.config.context_window
+                    ).to(self._device)
+                    with torch.no_grad():
+                        self.model(**warmup_inputs)
+                except Exception as e:
+                    logger.warning(f"Model warmup failed: {str(e)}")
+                    if self.model.forward is not eager_forward:
+                        logger.warning("Falling back to the uncompiled model")
+                        self.model.forward = eager_forward
+                
+                # The weights now live in the model's own tensors; cached file
+                # pages would only hold a second copy
+                if self.config.evict_weight_cache:
+                    _evict_from_page_cache(weight_files(self._model_path))
+                
                 self._loading_progress = 100
                 logger.info("Model loaded successfully")
                 return True
                 
             except Exception as e:
-                logger.error(f"Error loading model: {str(e)}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
+                logger.exception(f"Error loading model: {str(e)}")
                 self.model = None
                 self.tokenizer = None
-                with self._lock:
-                    self._loading = False
-                    self._loading_progress = 0
                 return False
             
             finally:
@@ -171,11 +424,8 @@ class ModelManager:
                     self._loading = False
                     self._loading_progress = 0
         
-        # Start loading in background thread
-        thread = threading.Thread(target=_load, daemon=True)
-        thread.start()
-        thread.join()  # Wait for loading to complete
-        return self.model is not None and self.tokenizer is not None
+        _load()
+        return self.is_model_available()
     
     def unload_model(self):
         """Unload the model and clean up resources."""
@@ -190,17 +440,49 @@ class ModelManager:
             if self.tokenizer is not None:
                 del self.tokenizer
                 self.tokenizer = None
+            
+            self._llama = None
+            
+            if self._worker is not None:
+                self._worker.stop()
+                self._worker = None
+            
+            with self._prefix_lock:
+                self._prefix_cache.clear()
+            
+            with self._input_lock:
+                if self._device.type != "cpu":
+                    self._device = torch.device("cpu")
+                    self._input_buf = self._input_buf.cpu()
+                    self._mask_buf = self._mask_buf.cpu()
                 
             self._loading = False
             self._loading_progress = 0
+            self._paused = False
             
             # Clean up memory and temporary files
-            self._cleanup_memory()
+            self._cleanup_memory(release_cuda=True)
     
     def is_model_available(self) -> bool:
         """Check if the model is available for use."""
+        if self._worker is not None:
+            return self._worker.is_alive()
+        if self._llama is not None:
+            return True
         return self.model is not None and self.tokenizer is not None
     
+    def pause(self) -> None:
+        """Stop serving completions while keeping the model loaded."""
+        self._paused = True
+    
+    def resume(self) -> None:
+        """Serve completions again after pause()."""
+        self._paused = False
+    
+    def is_paused(self) -> bool:
+        """Check if completions are paused."""
+        return self._paused
+    
     def is_model_loading(self) -> bool:
         """Check if the model is currently loading."""
         return self._loading
@@ -219,62 +501,284 @@ class ModelManager:
     
     def get_completion(self, prompt: str, context: Dict[str, Any] = None) -> Optional[str]:
         """Get a completion from the model."""
-        if not self.is_model_available():
+        if not self.is_model_available() or self._paused:
             logger.warning("Model not available for completion")
             return None
             
         try:
-            # Prepare the prompt with context
-            if context:
-                file_ext = context.get('file_extension', '')
-                app_name = context.get('app_name', '')
-                if file_ext:
-                    prompt = f"Language: {file_ext}\n{prompt}"
-                if app_name:
-                    prompt = f"Application: {app_name}\n{prompt}"
+            if self._worker is not None:
+                return self._worker.request(prompt, context)
             
-            # Add instruction for text generation
-            prompt = f"Generate a helpful response for the following text:\n{prompt}\nResponse:"
+            prefix, suffix = self._build_prompt(prompt, context)
             
-            # Generate completion with CPU optimizations
-            with torch.no_grad():  # Disable gradient calculation
-                # Set number of threads to 1 to avoid OMP errors
-                torch.set_num_threads(1)
+            if self._llama is not None:
+                return self._generate_llama(prefix + suffix)
+            
+            # Concurrent callers arriving within the batch window share one generate call
+            if self._batcher is not None:
+                return self._batcher.submit((prefix, suffix))
+            return self._generate(prefix, suffix)
                 
-                inputs = self.tokenizer(
-                    prompt,
-                    return_tensors="pt",
+        except Exception as e:
+            logger.exception(f"Error generating completion: {str(e)}")
+            return None
+    
+    def stream_completion(self, prompt: str, context: Dict[str, Any] = None) -> Iterator[str]:
+        """Yield a completion's text piece by piece as the tokens are generated."""
+        if not self.is_model_available() or self._paused:
+            logger.warning("Model not available for completion")
+            return
+            
+        if self._worker is not None:
+            yield from self._worker.stream(prompt, context)
+            return
+            
+        prefix, suffix = self._build_prompt(prompt, context)
+        
+        if self._llama is not None:
+            with self._llama_lock:
+                for chunk in self._llama(
+                    prefix + suffix,
+                    max_tokens=self.config.max_length,
+                    temperature=self.config.temperature,
+                    top_p=self.config.top_p,
+                    repeat_penalty=self.config.repetition_penalty,
+                    stop=["\n\n"],
+                    stream=True
+                ):
+                    yield chunk["choices"][0]["text"]
+            return
+        
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        stop_event = threading.Event()
+        
+        def _run():
+            try:
+                self._generate(prefix, suffix, streamer, stop_event)
+            except Exception as e:
+                logger.error(f"Error generating completion: {str(e)}")
+                streamer.end()  # Unblock the consumer
+        
+        thread = threading.Thread(target=_run, daemon=True)
+        thread.start()
+        try:
+            yield from streamer
+        finally:
+            # A consumer that closes the stream early also ends the generation
+            stop_event.set()
+            thread.join()
+    
+    def _build_prompt(self, prompt: str, context: Optional[Dict[str, Any]]) -> Tuple[str, str]:
+        """Prepare the prompt as a (prefix, suffix) pair.
+        
+        The prefix holds the generation instruction and context headers, which
+        repeat across requests; the suffix holds the text to respond to.
+        """
+        # Add instruction for text generation
+        prefix = "Generate a helpful response for the following text:\n"
+        
+        # Prepare the prompt with context
+        if context:
+            file_ext = context.get('file_extension', '')
+            app_name = context.get('app_name', '')
+            if app_name:
+                prefix += f"Application: {app_name}\n"
+            if file_ext:
+                prefix += f"Language: {file_ext}\n"
+        
+        return prefix, f"{prompt}\nResponse:"
+    
+    def _get_prefix_state(self, prefix: str) -> Tuple[torch.Tensor, Any]:
+        """Return the prefix's token ids and KV cache, prefilling it on first use."""
+        with self._prefix_lock:
+            entry = self._prefix_cache.get(prefix)
+            if entry is not None:
+                self._prefix_cache.move_to_end(prefix)
+                return entry
+        
+        prefix_ids = self.tokenizer(prefix, return_tensors="pt").input_ids.to(self._device)
+        outputs = self.model(input_ids=prefix_ids, use_cache=True)
+        entry = (prefix_ids, outputs.past_key_values)
+        
+        with self._prefix_lock:
+            self._prefix_cache[prefix] = entry
+            while len(self._prefix_cache) > _PREFIX_CACHE_SIZE:
+                self._prefix_cache.popitem(last=False)
+        return entry
+    
+    def _generation_kwargs(self) -> Dict[str, Any]:
+        """Sampling settings shared by single and batched generation."""
+        kwargs = {
+            "max_new_tokens": self.config.max_length,  # Limit response length
+            "temperature": self.config.temperature,
+            "top_p": self.config.top_p,
+            "do_sample": True,
+            "num_return_sequences": 1,
+            "pad_token_id": self.tokenizer.eos_token_id,
+            "repetition_penalty": self.config.repetition_penalty,  # Prevent repetitive text
+            "num_beams": 1,  # Use greedy search to save memory
+            "early_stopping": False,  # Disable early stopping since we're not using beam search
+            "use_cache": True  # Reuse attention keys/values instead of recomputing them per token
+        }
+        # n-gram blocking rescans the whole output on every step, so it is opt-in
+        if self.config.no_repeat_ngram_size > 0:
+            kwargs["no_repeat_ngram_size"] = self.config.no_repeat_ngram_size
+        return kwargs
+    
+    def _generate_llama(self, prompt: str) -> Optional[str]:
+        """Generate a completion with the llama.cpp model."""
+        with self._llama_lock:
+            output = self._llama(
+                prompt,
+                max_tokens=self.config.max_length,
+                temperature=self.config.temperature,
+                top_p=self.config.top_p,
+                repeat_penalty=self.config.repetition_penalty,
+                stop=["\n\n"]
+            )
+        
+        new_text = output["choices"][0]["text"].strip()
+        if new_text:
+            logger.info(f"Generated completion: {new_text[:100]}...")
+            return new_text
+        logger.warning("No new text generated")
+        return None
+    
+    def _generate(self, prefix: str, suffix: str,
+                  streamer: Optional[TextIteratorStreamer] = None,
+                  stop_event: Optional[threading.Event] = None) -> Optional[str]:
+        """Generate a completion for a single prepared prompt, optionally feeding a streamer.
+        
+        Setting stop_event ends the generation after the current token.
+        """
+        # Generate completion with CPU optimizations
+        with torch.no_grad():  # Disable gradient calculation
+            generate_args = self._generation_kwargs()
+            if streamer is not None:
+                generate_args["streamer"] = streamer
+            if stop_event is not None:
+                generate_args["stopping_criteria"] = StoppingCriteriaList([_StopOnEvent(stop_event)])
+            if self.config.use_cache:
+                # Reuse the prefilled KV cache of the shared prefix so only the
+                # suffix tokens go through the prompt forward pass
+                prefix_ids, prefix_kv = self._get_prefix_state(prefix)
+                suffix_ids = self.tokenizer(
+                    suffix,
+                    return_tensors="np",
+                    add_special_tokens=False
+                ).input_ids[0]
+                # generate() extends the cache in place, so hand it a private copy
+                generate_args["past_key_values"] = copy.deepcopy(prefix_kv)
+            else:
+                prefix_ids = None
+                prompt_ids = self.tokenizer(
+                    prefix + suffix,
+                    return_tensors="np",
                     truncation=True,
                     max_length=self.config.context_window
-                )
+                ).input_ids[0]
+            
+            with self._input_lock:
+                if prefix_ids is not None:
+                    n_prefix = prefix_ids.shape[1]
+                    n = min(self.config.context_window, n_prefix + len(suffix_ids))
+                    self._input_buf[0, :n_prefix] = prefix_ids[0]
+                    self._input_buf[0, n_prefix:n] = torch.from_numpy(suffix_ids[:n - n_prefix])
+                else:
+                    n = len(prompt_ids)
+                    self._input_buf[0, :n] = torch.from_numpy(prompt_ids)
                 
                 # Generate with memory-efficient settings
                 outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=100,  # Limit response length
-                    temperature=0.7,  # Slightly more creative
-                    top_p=0.9,  # More focused sampling
-                    do_sample=True,
-                    num_return_sequences=1,
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    repetition_penalty=1.2,  # Prevent repetitive text
-                    no_repeat_ngram_size=3,  # Prevent repeating phrases
-                    num_beams=1,  # Use greedy search to save memory
-                    early_stopping=False  # Disable early stopping since we're not using beam search
+                    input_ids=self._input_buf[:, :n],
+                    attention_mask=self._mask_buf[:, :n],
+                    **generate_args
                 )
-                
-                completion = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-                
-                # Return only the new text
-                new_text = completion[len(prompt):].strip()
-                if new_text:
-                    logger.info(f"Generated completion: {new_text[:100]}...")
-                    return new_text
-                logger.warning("No new text generated")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error generating completion: {str(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            return None 
\ No newline at end of file
+            
+            # Decode only the generated tokens
+            new_text = self.tokenizer.decode(outputs[0, n:], skip_special_tokens=True).strip()
+            if new_text:
+                logger.info(f"Generated completion: {new_text[:100]}...")
+                return new_text
+            logger.warning("No new text generated")
+            return None
+    
+    def _generate_batch(self, prompts: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """Generate completions for several prepared prompts in one padded forward pass."""
+        if len(prompts) == 1:
+            return [self._generate(*prompts[0])]
+        
+        if self.config.use_cache and len({prefix for prefix, _ in prompts}) == 1:
+            return self._generate_batch_shared_prefix(prompts[0][0], [suffix for _, suffix in prompts])
+        
+        with torch.no_grad():
+            inputs = self.tokenizer(
+                [prefix + suffix for prefix, suffix in prompts],
+                return_tensors="pt",
+                padding=True,
+                truncation=True,
+                max_length=self.config.context_window
+            ).to(self._device)
+            
+            outputs = self.model.generate(**inputs, **self._generation_kwargs())
+            
+            # Decode only the generated tokens of each row
+            prompt_length = inputs["input_ids"].shape[1]
+            completions = []
+            for row in outputs:
+                new_text = self.tokenizer.decode(row[prompt_length:], skip_special_tokens=True).strip()
+                completions.append(new_text or None)
+            logger.info(f"Generated {len(prompts)} completions in one batch")
+            return completions
+
+    
+    def _generate_batch_shared_prefix(self, prefix: str, suffixes: List[str]) -> List[Optional[str]]:
+        """Generate completions for several suffixes of one prefix, prefilling the prefix only once.
+        
+        Each row is laid out as prefix, left padding, suffix; the attention
+        mask hides the padding, so positions after the prefix stay contiguous.
+        """
+        with torch.no_grad():
+            prefix_ids, prefix_kv = self._get_prefix_state(prefix)
+            n_prefix = prefix_ids.shape[1]
+            suffix_inputs = self.tokenizer(
+                suffixes,
+                return_tensors="pt",
+                padding=True,
+                truncation=True,
+                max_length=max(1, self.config.context_window - n_prefix),
+                add_special_tokens=False
+            ).to(self._device)
+            batch_size = len(suffixes)
+            input_ids = torch.cat([prefix_ids.expand(batch_size, -1), suffix_inputs["input_ids"]], dim=1)
+            attention_mask = torch.cat(
+                [torch.ones((batch_size, n_prefix), dtype=torch.long, device=self._device),
+                 suffix_inputs["attention_mask"]],
+                dim=1
+            )
+            
+            # Repeat the cache once per row; this also leaves the cached prefix
+            # untouched when generate() extends the cache in place
+            if isinstance(prefix_kv, DynamicCache):
+                past_key_values = copy.deepcopy(prefix_kv)
+                past_key_values.batch_repeat_interleave(batch_size)
+            else:
+                past_key_values = tuple(
+                    tuple(tensor.repeat_interleave(batch_size, dim=0) for tensor in layer)
+                    for layer in prefix_kv
+                )
+            
+            outputs = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                past_key_values=past_key_values,
+                **self._generation_kwargs()
+            )
+            
+            prompt_length = input_ids.shape[1]
+            completions = []
+            for row in outputs:
+                new_text = self.tokenizer.decode(row[prompt_length:], skip_special_tokens=True).strip()
+                completions.append(new_text or None)
+            logger.info(f"Generated {batch_size} completions in one batch sharing a cached prefix")
+            return completions
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""
+Prompt cache for reusing model completions on repeated prompts.
+"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Hashable, Optional
+
+class PromptCache:
+    """Exact-match completion cache that evicts the least recently used entries."""
+
+    def __init__(self, max_entries: int = 512):
+        self._max_entries = max_entries
+        self._lock = Lock()
+        # Ordered from least to most recently used
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """Return the cached completion for the key, marking it as recently used."""
+        with self._lock:
+            completion = self._entries.get(key)
+            if completion is not None:
+                self._entries.move_to_end(key)
+            return completion
+
+    def put(self, key: Hashable, completion: str) -> None:
+        """Store a completion, evicting the oldest entries beyond max_entries."""
+        with self._lock:
+            self._entries[key] = completion
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached completions."""
+        with self._lock:
+            self._entries.clear()
\ No newline at end of file
@@ -1,24 +1,62 @@
 import json
 import os
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'shortcuts.json')
 
 _shortcuts = None
+# Modification time of the loaded config, so edits are picked up without a restart
+_shortcuts_mtime = None
+# (lower-cased app name, app name) pairs in config order
+_app_names = []
+# Matches every app name in one pass over a window title; None without pyahocorasick
+_automaton = None
+
+def _build_app_index(shortcuts):
+    global _app_names, _automaton
+    _app_names = [(app_name.lower(), app_name) for app_name in shortcuts]
+    _automaton = None
+    if ahocorasick is not None and _app_names:
+        _automaton = ahocorasick.Automaton()
+        for index, (name_lower, app_name) in enumerate(_app_names):
+            if name_lower and name_lower not in _automaton:
+                _automaton.add_word(name_lower, (index, app_name))
+        _automaton.make_automaton()
 
 def load_shortcuts():
-    global _shortcuts
-    if _shortcuts is None:
+    global _shortcuts, _shortcuts_mtime
+    try:
+        mtime = os.stat(CONFIG_PATH).st_mtime_ns
+    except OSError:
+        mtime = None
+    if _shortcuts is None or mtime != _shortcuts_mtime:
         try:
-            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-                _shortcuts = json.load(f)
+            with open(CONFIG_PATH, 'rb') as f:
+                _shortcuts = _loads(f.read())
         except Exception:
             _shortcuts = {}
+        _shortcuts_mtime = mtime
+        _build_app_index(_shortcuts)
     return _shortcuts
 
 def get_shortcuts_for_app(window_title):
     shortcuts = load_shortcuts()
     window_title_lower = window_title.lower() if window_title else ""
-    for app_name, app_shortcuts in shortcuts.items():
-        if app_name.lower() in window_title_lower:
-            return app_shortcuts
-    return [] 
\ No newline at end of file
+    if _automaton is not None:
+        # Several names can occur in one title; the first in config order wins
+        match = min((value for _, value in _automaton.iter(window_title_lower)), default=None)
+        return shortcuts[match[1]] if match else []
+    for name_lower, app_name in _app_names:
+        if name_lower in window_title_lower:
+            return shortcuts[app_name]
+    return []
\ No newline at end of file
@@ -3,13 +3,20 @@
 UltimateOverlay entry point.
 Run this file to start the overlay application.
 """
-try:
-    # Try direct import first (when running from within the directory)
-    from overlay.window import OverlayWindow
-except ImportError:
-    # Fallback to package import (when installed as a package)
-    from The_Ultimate_Overlay_App.overlay.window import OverlayWindow
+import logging
+import multiprocessing
+import sys
 
 if __name__ == "__main__":
+    # Frozen builds re-run this file to start the inference worker process
+    multiprocessing.freeze_support()
+    # Imported here so spawned worker processes, which re-run this file, skip the GUI
+    from The_Ultimate_Overlay_App.overlay.window import OverlayWindow
+    # Skip log setup when running optimized (python -O)
+    if sys.flags.optimize == 0:
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
     window = OverlayWindow()
-    window.run() 
\ No newline at end of file
+    window.run()
\ No newline at end of file
@@ -1,28 +1,73 @@
 """
 AI widget for the overlay.
 """
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QPushButton, QLabel, QProgressBar, QTextEdit, QToolTip, QMessageBox, QApplication
-from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QPoint, QSize, QRect
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QPushButton, QLabel, QProgressBar, QTextEdit, QToolTip, QMessageBox, QApplication, QMenu
+from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QPoint, QSize, QRect, QThreadPool, QFileSystemWatcher
 from PyQt6.QtGui import QIcon, QFont, QCursor
 import logging
 import os
 from The_Ultimate_Overlay_App.ai.config import AIConfig
-from The_Ultimate_Overlay_App.ai.completion_system import CompletionSystem
 from The_Ultimate_Overlay_App.ai.model_downloader import ModelDownloader
-import threading
+from The_Ultimate_Overlay_App.ai.prompt_cache import PromptCache
 import time
 
 logger = logging.getLogger(__name__)
 
+# Quiet period after the last explanation request before it is dispatched
+_EXPLANATION_DEBOUNCE_MS = 200
+# Refresh interval of the download progress bar (about 30 fps)
+_PROGRESS_REFRESH_MS = 33
+# Finished explanations kept in memory for repeated selections
+_EXPLANATION_CACHE_SIZE = 256
+# How long exit waits for running background jobs (e.g. a cancelled download)
+_SHUTDOWN_WAIT_MS = 3000
+
+# Stylesheets are built once at import rather than for every widget
+TOGGLE_BUTTON_STYLE = """
+QPushButton {
+    background-color: #2d2d2d;
+    color: #ffffff;
+    border: 1px solid #3d3d3d;
+    border-radius: 4px;
+    padding: 5px 10px;
+    font-size: 12px;
+}
+QPushButton:hover {
+    background-color: #3d3d3d;
+    border-color: #4d4d4d;
+}
+QPushButton:checked {
+    background-color: #4CAF50;
+    border-color: #45a049;
+    color: white;
+}
+QPushButton:disabled {
+    background-color: #1d1d1d;
+    color: #666666;
+    border-color: #2d2d2d;
+}
+"""
+PROGRESS_BAR_STYLE = """
+QProgressBar {
+    border: none;
+    background-color: #2d2d2d;
+}
+QProgressBar::chunk {
+    background-color: #4CAF50;
+}
+"""
+
 class AIWidget(QWidget):
     """Widget for AI features."""
     
-    completion_ready = pyqtSignal(str, str)  # completion, query_text
-    download_progress = pyqtSignal(int)
+    completion_ready = pyqtSignal(str, str, bool)  # completion, query_text, partial
     download_complete = pyqtSignal()
     download_failed = pyqtSignal()
     load_complete = pyqtSignal()
     load_failed = pyqtSignal()
+    model_installed_changed = pyqtSignal(bool)
+    status_changed = pyqtSignal(str)
+    explanation_finished = pyqtSignal()
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -31,30 +76,77 @@ class AIWidget(QWidget):
         self.is_enabled = False
         self.is_loading = False
         self.is_downloading = False
+        self._download_cancelled = False
+        # Latest download percentage reported by the worker, shown by _progress_timer
+        self._pending_progress = None
         self.explanation_widgets = []
         self._pending_text = None
         self._pending_context = None
         self._query_text = None
+        # Only one explanation runs at a time; newer requests wait in the pending slot
+        self._explanation_in_flight = False
+        # Bumped by every request; a running explanation with an older number is stale
+        self._explanation_generation = 0
+        # Inputs of the last refresh_model_status UI update, to skip repeats
+        self._ui_state = None
         
         # Initialize components
         self.config = AIConfig()
-        self.completion_system = CompletionSystem(self.config)
-        self.model_downloader = ModelDownloader(self.config)
+        # Created by _ensure_backend() on first enable; importing it pulls in torch
+        self.completion_system = None
+        # Created by the model_downloader property on first use
+        self._model_downloader = None
+        
+        # Bounded pool for background work started from the UI; results come
+        # back through the signals below
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
+        
+        # Explanations of recent selections, so re-selecting text skips the worker entirely
+        self._explanation_cache = PromptCache(max_entries=_EXPLANATION_CACHE_SIZE)
         
         # Connect signals
-        self.download_progress.connect(self.update_download_progress)
         self.download_complete.connect(self._download_complete)
         self.download_failed.connect(self._download_failed)
         self.load_complete.connect(self._load_complete)
         self.load_failed.connect(self._load_failed)
+        self.status_changed.connect(self._set_status)
+        self.explanation_finished.connect(self._on_explanation_finished)
         
-        # Set up UI
-        self.setup_ui()
+        # Restarted by every request, so a burst only dispatches its last one
+        self._explanation_timer = QTimer(self)
+        self._explanation_timer.setSingleShot(True)
+        self._explanation_timer.setInterval(_EXPLANATION_DEBOUNCE_MS)
+        self._explanation_timer.timeout.connect(self._process_explanation_request)
+        
+        # Repaints the download progress at a fixed rate; the worker only
+        # overwrites the pending value, so a stalled GUI never replays a backlog
+        self._progress_timer = QTimer(self)
+        self._progress_timer.setInterval(_PROGRESS_REFRESH_MS)
+        self._progress_timer.timeout.connect(self._flush_download_progress)
         
-        # Start periodic model status check
-        self.status_timer = QTimer()
-        self.status_timer.timeout.connect(self.refresh_model_status)
-        self.status_timer.start(5000)  # Check every 5 seconds
+        # Frees a paused model once it has stayed disabled for model_park_secs
+        self._park_timer = QTimer(self)
+        self._park_timer.setSingleShot(True)
+        self._park_timer.timeout.connect(self._release_parked_model)
+        
+        # Refresh the model status only when the downloader reports a change;
+        # the listener runs on the download thread, so bridge it through a signal
+        self.model_installed_changed.connect(lambda installed: self.refresh_model_status())
+        
+        # Pick up model files added or removed by anything other than the
+        # downloader; the directories are added by _initial_model_check()
+        self._model_watcher = QFileSystemWatcher(self)
+        self._model_watcher.directoryChanged.connect(self._on_model_dir_changed)
+        
+        # Cancel background work on exit; the pool would otherwise wait for a
+        # running download to finish before the process can quit
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.shutdown)
+        
+        # Set up UI (this also schedules the first look at the model directory)
+        self.setup_ui()
         
     def setup_ui(self):
         """Set up the UI components."""
@@ -65,34 +157,15 @@ class AIWidget(QWidget):
         # AI toggle button
         self.toggle_button = QPushButton("AI")
         self.toggle_button.setCheckable(True)
-        self.toggle_button.clicked.connect(self.toggle_ai)
+        self.toggle_button.clicked.connect(self._on_toggle_clicked)
         self.toggle_button.setFixedSize(60, 30)
-        self.toggle_button.setStyleSheet("""
-            QPushButton {
-                background-color: #2d2d2d;
-                color: #ffffff;
-                border: 1px solid #3d3d3d;
-                border-radius: 4px;
-                padding: 5px 10px;
-                font-size: 12px;
-            }
-            QPushButton:hover {
-                background-color: #3d3d3d;
-                border-color: #4d4d4d;
-            }
-            QPushButton:checked {
-                background-color: #4CAF50;
-                border-color: #45a049;
-                color: white;
-            }
-            QPushButton:disabled {
-                background-color: #1d1d1d;
-                color: #666666;
-                border-color: #2d2d2d;
-            }
-        """)
+        self.toggle_button.setStyleSheet(TOGGLE_BUTTON_STYLE)
         layout.addWidget(self.toggle_button)
         
+        # Right-click menu for releasing the model's memory
+        self.toggle_button.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.toggle_button.customContextMenuRequested.connect(self.show_model_menu)
+        
         # Status label
         self.status_label = QLabel("AI: Off")
         self.status_label.setStyleSheet("color: #aeefff; font-size: 10px;")
@@ -104,58 +177,86 @@ class AIWidget(QWidget):
         self.progress_bar.setVisible(False)
         self.progress_bar.setFixedHeight(4)
         self.progress_bar.setTextVisible(False)
-        self.progress_bar.setStyleSheet("""
-            QProgressBar {
-                border: none;
-                background-color: #2d2d2d;
-            }
-            QProgressBar::chunk {
-                background-color: #4CAF50;
-            }
-        """)
+        self.progress_bar.setStyleSheet(PROGRESS_BAR_STYLE)
         layout.addWidget(self.progress_bar)
         
         self.setLayout(layout)
         
-        # Initial model status check
+        # Touch the model directory only once the event loop runs, so resolving
+        # and verifying it does not hold up showing the overlay
+        QTimer.singleShot(0, self._initial_model_check)
+    
+    @property
+    def model_downloader(self):
+        """The model downloader, created on first use."""
+        if self._model_downloader is None:
+            self._model_downloader = ModelDownloader(self.config)
+            self._model_downloader.add_installed_listener(self.model_installed_changed.emit)
+        return self._model_downloader
+    
+    def _initial_model_check(self):
+        """Start watching the model directory and show whether the model is installed."""
+        self._watch_model_dir()
         self.refresh_model_status()
     
+    def _watch_model_dir(self):
+        """Watch the model directory, or its parent until the directory exists."""
+        model_path = self.config.model_path
+        parent = os.path.dirname(model_path)
+        for path in (model_path, parent):
+            if os.path.isdir(path) and path not in self._model_watcher.directories():
+                self._model_watcher.addPath(path)
+    
+    def _on_model_dir_changed(self, path):
+        """Recheck the installed model after a change on disk."""
+        if self.is_downloading:
+            return  # The downloader reports its own result
+        self._watch_model_dir()
+        self.model_downloader.invalidate_installed_cache()
+        self.refresh_model_status()
+    
+    def _set_status(self, text):
+        """Update the status label; connected to status_changed for worker threads."""
+        self.status_label.setText(text)
+    
     def refresh_model_status(self):
         """Check model status and update UI accordingly."""
         if self.is_downloading or self.is_loading:
             return  # Don't interrupt ongoing operations
             
         try:
-            if not self.model_downloader.is_model_installed():
+            installed = self.model_downloader.is_model_installed()
+            state = (installed, self.is_enabled, self.is_loading, self.is_downloading)
+            if state == self._ui_state:
+                return  # Nothing changed since the last refresh
+            self._ui_state = state
+            
+            if not installed:
                 self.toggle_button.setEnabled(True)
                 self.status_label.setText("AI: Model not installed")
                 self.toggle_button.setText("Download Model")
                 self.toggle_button.setChecked(False)
                 self.is_enabled = False
-                
-                # Ensure correct button connection
-                try:
-                    self.toggle_button.clicked.disconnect()
-                except Exception:
-                    pass
-                self.toggle_button.clicked.connect(self.start_download)
             else:
                 if not self.is_enabled:
                     self.toggle_button.setEnabled(True)
                     self.toggle_button.setText("AI")
                     self.status_label.setText("AI: Ready")
-                    
-                    # Ensure correct button connection
-                    try:
-                        self.toggle_button.clicked.disconnect()
-                    except Exception:
-                        pass
-                    self.toggle_button.clicked.connect(self.toggle_ai)
         except Exception as e:
             logger.error(f"Error checking model status: {str(e)}")
+            self._ui_state = None
             self.status_label.setText("AI: Error")
             self.toggle_button.setEnabled(False)
     
+    def _on_toggle_clicked(self):
+        """Download the model if it is missing, otherwise toggle AI features."""
+        if self.is_downloading:
+            self.cancel_download()
+        elif not self.model_downloader.is_model_installed():
+            self.start_download()
+        else:
+            self.toggle_ai()
+    
     def start_download(self):
         """Start model download with error handling."""
         if self.is_downloading:
@@ -163,28 +264,55 @@ class AIWidget(QWidget):
             
         try:
             self.is_downloading = True
-            self.toggle_button.setEnabled(False)
+            self._download_cancelled = False
+            self.toggle_button.setText("Cancel Download")
             self.status_label.setText("AI: Downloading model...")
             self.progress_bar.setVisible(True)
             self.progress_bar.setValue(0)
+            self._pending_progress = None
+            self._progress_timer.start()
             
-            # Start download in a separate thread
-            threading.Thread(target=self._download_thread, daemon=True).start()
+            # Run the download on the widget's thread pool, importing the
+            # completion system alongside it so loading can start right away
+            self._pool.start(self._download_thread)
+            if self.completion_system is None:
+                self._pool.start(self._preload_backend)
             
         except Exception as e:
             logger.error(f"Error starting download: {str(e)}")
+            self._progress_timer.stop()
             self.is_downloading = False
             self.status_label.setText("AI: Download failed")
             self.toggle_button.setEnabled(True)
             self.progress_bar.setVisible(False)
             QMessageBox.critical(self, "Error", f"Failed to start download: {str(e)}")
     
+    def cancel_download(self):
+        """Stop the running download; files already fetched are kept for the next attempt."""
+        if not self.is_downloading or self._download_cancelled:
+            return
+        logger.info("Cancelling model download")
+        self._download_cancelled = True
+        self.toggle_button.setChecked(False)
+        self.toggle_button.setEnabled(False)
+        self.status_label.setText("AI: Cancelling download...")
+        self.model_downloader.cancel_download()
+    
+    def _preload_backend(self):
+        """Import the completion system's dependencies; runs on the thread pool."""
+        try:
+            import The_Ultimate_Overlay_App.ai.completion_system  # noqa: F401
+        except Exception as e:
+            logger.warning(f"Error preloading AI backend: {str(e)}")
+    
     def _download_thread(self):
         """Handle download in background thread."""
+        def report_progress(p):
+            # Picked up by _progress_timer on the GUI thread
+            self._pending_progress = int(p)
+        
         try:
-            success = self.model_downloader.download_model(
-                lambda p: self.download_progress.emit(p)
-            )
+            success = self.model_downloader.download_model(report_progress)
             if success:
                 self.download_complete.emit()
             else:
@@ -194,69 +322,43 @@ class AIWidget(QWidget):
             self.download_failed.emit()
     
     def update_download_progress(self, progress: int):
-        """Update download progress from signal."""
-        self.progress_bar.setValue(progress)
+        """Update the download progress bar."""
+        if progress != self.progress_bar.value():
+            self.progress_bar.setValue(progress)
+    
+    def _flush_download_progress(self):
+        """Show the latest reported download progress; runs on _progress_timer."""
+        progress = self._pending_progress
+        if progress is not None:
+            self._pending_progress = None
+            self.update_download_progress(progress)
     
     def _download_complete(self):
-        """Handle download completion."""
-        try:
-            logger.info("Download complete, attempting to load model...")
-            self.is_downloading = False
-            self.toggle_button.setEnabled(True)
-            self.progress_bar.setVisible(False)
-            
-            if self.model_downloader.load_model():
-                logger.info("Model loaded successfully")
-                self.is_enabled = True
-                self.toggle_button.setChecked(True)
-                self.status_label.setText("AI: Ready")
-                self.load_complete.emit()
-                
-                # Update button connection
-                try:
-                    self.toggle_button.clicked.disconnect()
-                except Exception:
-                    pass
-                self.toggle_button.clicked.connect(self.toggle_ai)
-            else:
-                logger.error("Failed to load model after download")
-                self.status_label.setText("AI: Load Failed")
-                self.toggle_button.setChecked(False)
-                self.load_failed.emit()
-                # Show error message to user
-                QMessageBox.critical(
-                    self,
-                    "Model Load Failed",
-                    "Failed to load the AI model. Please check the logs for details."
-                )
-        except Exception as e:
-            logger.error(f"Error in download completion handler: {str(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            self.status_label.setText("AI: Error")
-            self.toggle_button.setChecked(False)
-            self.load_failed.emit()
-            # Show error message to user
-            QMessageBox.critical(
-                self,
-                "Model Load Error",
-                f"An error occurred while loading the model: {str(e)}"
-            )
+        """Handle download completion by loading the model for completions."""
+        logger.info("Download complete, loading model...")
+        self._progress_timer.stop()
+        self.is_downloading = False
+        self.is_enabled = True
+        self.toggle_button.setEnabled(True)
+        self.toggle_button.setText("AI")
+        self.toggle_button.setChecked(True)
+        # Loads on the thread pool; failures are reported by _load_failed
+        self.start_loading()
     
     def _download_failed(self):
         """Handle download failure from signal."""
+        self._progress_timer.stop()
         self.is_downloading = False
         self.toggle_button.setEnabled(True)
         self.status_label.setText("AI: Download failed")
         self.progress_bar.setVisible(False)
+        if self._download_cancelled:
+            self._download_cancelled = False
+            self.status_label.setText("AI: Download cancelled")
+            self.toggle_button.setText("Download Model")
+            return
         self.toggle_button.setText("Retry Download")
         
-        try:
-            self.toggle_button.clicked.disconnect()
-        except Exception:
-            pass
-        self.toggle_button.clicked.connect(self.start_download)
-        
         QMessageBox.warning(self, "Download Failed", 
                           "Failed to download the model. Please check your internet connection and try again.")
     
@@ -272,8 +374,29 @@ class AIWidget(QWidget):
         else:
             self.stop_loading()
     
+    def _ensure_backend(self):
+        """Import and create the completion system on first use."""
+        if self.completion_system is None:
+            from The_Ultimate_Overlay_App.ai.completion_system import CompletionSystem
+            self.completion_system = CompletionSystem(self.config, downloader=self.model_downloader)
+        return self.completion_system
+    
     def start_loading(self):
         """Start loading the model."""
+        try:
+            model_manager = self._ensure_backend().model_manager
+        except Exception as e:
+            logger.error(f"Error initializing AI backend: {str(e)}")
+            self.load_failed.emit()
+            return
+        self._park_timer.stop()
+        if model_manager.is_model_available():
+            # Still resident from an earlier toggle, so just resume serving it
+            model_manager.resume()
+            self.is_loading = True
+            self.load_complete.emit()
+            return
+            
         try:
             self.is_loading = True
             logger.info("Enabling AI features")
@@ -281,23 +404,29 @@ class AIWidget(QWidget):
             self.progress_bar.setVisible(True)
             self.progress_bar.setValue(0)
             
-            # Start loading in background thread
-            threading.Thread(target=self._load_thread, daemon=True).start()
+            # Load on the widget's thread pool; the result comes back through the load signals
+            self._pool.start(self._load_thread)
             
         except Exception as e:
             logger.error(f"Error starting model load: {str(e)}")
             self.load_failed.emit()
     
     def _load_thread(self):
-        """Handle model loading in background thread."""
+        """Load the model and smoke-test it; runs on the thread pool."""
         try:
-            success = self.completion_system.model_manager.load_model()
-            if success:
-                self.load_complete.emit()
-            else:
+            model_manager = self.completion_system.model_manager
+            if not model_manager.load_model():
                 self.load_failed.emit()
+                return
+            
+            # Test the model itself with a simple completion, bypassing the disk cache
+            if model_manager.get_completion("Test"):
+                logger.info("Model test successful")
+            else:
+                logger.warning("Model test failed - no completion generated")
+            self.load_complete.emit()
         except Exception as e:
-            logger.error(f"Load error: {str(e)}")
+            logger.error(f"Model load error: {str(e)}")
             self.load_failed.emit()
     
     def _load_complete(self):
@@ -310,18 +439,9 @@ class AIWidget(QWidget):
             self.toggle_button.setEnabled(True)
             self.status_label.setText("AI: Ready")
             self.progress_bar.setVisible(False)
-            
-            # Test the model with a simple completion
-            test_completion = self.completion_system.get_completion("Test")
-            if test_completion:
-                logger.info("Model test successful")
-            else:
-                logger.warning("Model test failed - no completion generated")
                 
         except Exception as e:
-            logger.error(f"Error in load completion handler: {str(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.exception(f"Error in load completion handler: {str(e)}")
             self.status_label.setText("AI: Error")
             self.toggle_button.setChecked(False)
             # Show error message to user
@@ -335,7 +455,9 @@ class AIWidget(QWidget):
         """Handle model load failure."""
         try:
             logger.error("Model load failed")
+            self.is_loading = False
             self.is_enabled = False
+            self.progress_bar.setVisible(False)
             self.toggle_button.setChecked(False)
             self.status_label.setText("AI: Load Failed")
             # Show error message to user
@@ -344,24 +466,76 @@ class AIWidget(QWidget):
                 "Model Load Failed",
                 "Failed to load the AI model. Please check the logs for details."
             )
+            # The load may have found the model files invalid
+            self._ui_state = None
+            self.refresh_model_status()
         except Exception as e:
-            logger.error(f"Error in load failure handler: {str(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.exception(f"Error in load failure handler: {str(e)}")
             self.status_label.setText("AI: Error")
             self.toggle_button.setChecked(False)
     
     def stop_loading(self):
-        """Stop AI features and unload model."""
+        """Stop AI features, keeping the model loaded for a fast re-enable."""
         try:
             logger.info("Disabling AI features")
             self.status_label.setText("AI: Off")
             self.progress_bar.setVisible(False)
-            self.completion_system.model_manager.unload_model()
+            if self.completion_system is not None:
+                self.completion_system.model_manager.pause()
+                if self.config.model_park_secs > 0:
+                    self._park_timer.start(self.config.model_park_secs * 1000)
             self.is_enabled = False
         except Exception as e:
             logger.error(f"Error stopping AI: {str(e)}")
     
+    def _release_parked_model(self):
+        """Unload a model that stayed disabled for the whole park period."""
+        if self.is_enabled or self.is_loading or self.completion_system is None:
+            return
+        logger.info("Releasing parked AI model")
+        self.completion_system.model_manager.unload_model()
+    
+    def shutdown(self):
+        """Stop timers and background jobs before the application exits."""
+        self._explanation_timer.stop()
+        self._progress_timer.stop()
+        self._park_timer.stop()
+        if self.is_downloading:
+            self.cancel_download()
+        # Drop jobs that have not started, then give running ones a moment to stop
+        self._pool.clear()
+        if not self._pool.waitForDone(_SHUTDOWN_WAIT_MS):
+            logger.warning("AI background work still running at exit")
+        # Writes the recency of cache hits made since the last stored completion
+        if self.completion_system is not None and self.completion_system.disk_cache is not None:
+            self.completion_system.disk_cache.close()
+    
+    def show_model_menu(self, pos):
+        """Show the model context menu on the toggle button."""
+        menu = QMenu(self.toggle_button)
+        free_action = menu.addAction("Free model")
+        free_action.setEnabled(
+            not self.is_loading
+            and self.completion_system is not None
+            and self.completion_system.model_manager.is_model_available()
+        )
+        free_action.triggered.connect(self.free_model)
+        menu.exec(self.toggle_button.mapToGlobal(pos))
+    
+    def free_model(self):
+        """Unload the model to release its memory."""
+        try:
+            logger.info("Freeing AI model")
+            self._park_timer.stop()
+            if self.completion_system is not None:
+                self.completion_system.model_manager.unload_model()
+            if self.is_enabled:
+                self.is_enabled = False
+                self.toggle_button.setChecked(False)
+            self.status_label.setText("AI: Off")
+        except Exception as e:
+            logger.error(f"Error freeing model: {str(e)}")
+    
     def request_explanation(self, selected_text, context=None, query_text=None):
         """Request an explanation with proper error handling."""
         if not selected_text or not self.is_enabled or self.is_loading:
@@ -373,9 +547,10 @@ class AIWidget(QWidget):
             self._pending_text = selected_text
             self._pending_context = context
             self._query_text = query_text
+            self._explanation_generation += 1
             
-            # Use QTimer to process in the main thread
-            QTimer.singleShot(0, self._process_explanation_request)
+            # Dispatch once requests stop arriving for the debounce interval
+            self._explanation_timer.start()
             
         except Exception as e:
             logger.error(f"Error requesting explanation: {str(e)}")
@@ -383,59 +558,103 @@ class AIWidget(QWidget):
     def _process_explanation_request(self):
         """Process explanation request in the main thread."""
         try:
-            if not hasattr(self, '_pending_text') or not self._pending_text:
+            if not self._pending_text or self._explanation_in_flight:
+                # A request left pending is picked up when the running one finishes
                 return
                 
-            # Get stored text and context
+            # Take stored text and context
             selected_text = self._pending_text
             context = self._pending_context
             query_text = self._query_text
+            self._pending_text = None
+            self._pending_context = None
+            self._query_text = None
+            
+            cache_key = self._explanation_key(selected_text, context)
+            completion = self._explanation_cache.get(cache_key)
+            if completion is not None:
+                self.status_label.setText("AI: Ready")
+                self.completion_ready.emit(completion, query_text, False)
+                return
+            
+            self._explanation_in_flight = True
             
             # Show a temporary status message
             self.status_label.setText("AI: Generating...")
             
-            # Start explanation in background thread
-            threading.Thread(target=self._generate_explanation, 
-                           args=(selected_text, context, query_text),
-                           daemon=True).start()
+            # Only one explanation runs at a time, so there is nothing to batch;
+            # generate it on the thread pool
+            logger.info(f"Generating explanation for text: {selected_text[:50]}...")
+            generation = self._explanation_generation
+            self._pool.start(
+                lambda: self._explanation_thread(selected_text, context, query_text, cache_key, generation)
+            )
             
         except Exception as e:
             logger.error(f"Error processing explanation request: {str(e)}")
-            
-        finally:
-            # Clear pending data
-            self._pending_text = None
-            self._pending_context = None
-            self._query_text = None
+            self._explanation_in_flight = False
     
-    def _generate_explanation(self, selected_text, context=None, query_text=None):
-        """Generate explanation with error handling."""
+    @staticmethod
+    def _explanation_key(selected_text, context):
+        """Cache key of an explanation: the selection plus the context that shapes the prompt."""
+        context = context or {}
+        return (selected_text.strip(), context.get('app_name'), context.get('file_extension'))
+    
+    def _on_explanation_finished(self):
+        """Allow the next explanation and dispatch one that arrived meanwhile."""
+        self._explanation_in_flight = False
+        self._process_explanation_request()
+    
+    def _explanation_thread(self, selected_text, context, query_text, cache_key, generation):
+        """Stream one explanation so its text shows up as it is generated; runs on the thread pool."""
+        completion = ""
+        error = None
         try:
-            logger.info(f"Generating explanation for text: {selected_text[:50]}...")
+            stream = self.completion_system.stream_completion(selected_text, context)
+            try:
+                for piece in stream:
+                    if generation != self._explanation_generation:
+                        # A newer selection arrived; closing the stream stops the model
+                        break
+                    completion += piece
+                    if completion.strip():
+                        self.completion_ready.emit(completion.strip(), query_text, True)
+            finally:
+                stream.close()
+        except Exception as e:
+            error = e
+        self._explanation_done(completion.strip() or None, error, query_text, cache_key, generation)
+    
+    def _explanation_done(self, completion, error=None, query_text=None, cache_key=None, generation=None):
+        """Publish a finished explanation; runs on the thread pool."""
+        try:
+            if generation is not None and generation != self._explanation_generation:
+                logger.info("Dropping explanation for an outdated selection")
+                return
             
-            # Generate completion using the model
-            completion = self.completion_system.get_completion(
-                text=selected_text,
-                context=context
-            )
+            if error is not None:
+                raise error
             
             # Use Qt's signal/slot to update UI from the main thread
             if completion:
                 logger.info("Generated completion successfully")
+                if cache_key is not None:
+                    self._explanation_cache.put(cache_key, completion)
                 # Update status
-                QTimer.singleShot(0, lambda: self.status_label.setText("AI: Ready"))
+                self.status_changed.emit("AI: Ready")
                 # Emit the completion signal to display in overlay
-                self.completion_ready.emit(completion, query_text)
+                self.completion_ready.emit(completion, query_text, False)
             else:
                 logger.warning("No completion generated")
-                QTimer.singleShot(0, lambda: self.status_label.setText("AI: Failed"))
+                self.status_changed.emit("AI: Failed")
                 # Emit an error message for display
-                self.completion_ready.emit("No explanation could be generated. Please try with different text.", query_text)
+                self.completion_ready.emit("No explanation could be generated. Please try with different text.", query_text, False)
             
         except Exception as e:
             logger.error(f"Error generating explanation: {str(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
             # Set status to error and emit error message
-            QTimer.singleShot(0, lambda: self.status_label.setText("AI: Error"))
-            self.completion_ready.emit(f"Error generating explanation: {str(e)}", query_text) 
\ No newline at end of file
+            self.status_changed.emit("AI: Error")
+            self.completion_ready.emit(f"Error generating explanation: {str(e)}", query_text, False)
+            
+        finally:
+            self.explanation_finished.emit()
\ No newline at end of file
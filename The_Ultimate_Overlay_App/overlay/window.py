@@ -21,17 +21,39 @@ import win32con
 import win32com.client  # Required for accessibility APIs
 import logging
 from typing import Optional
+from functools import lru_cache
 
-# Set up logging
 logger = logging.getLogger(__name__)
-handler = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
-logger.setLevel(logging.INFO)
 
 KNOWLEDGE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'knowledge.json')
 FAVORITES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'favorites.json')
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources')
+
+ROW_BUTTON_STYLE = 'QToolButton { border: none; padding: 0 6px; }'
+ROW_HIGHLIGHT_STYLE = 'background: #3a7bd5; border-radius: 7px;'
+TOP_BUTTON_STYLE = """
+QPushButton {
+    background-color: #2d2d2d;
+    color: #ffffff;
+    border: 1px solid #3d3d3d;
+    border-radius: 4px;
+    padding: 5px 10px;
+    font-size: 12px;
+}
+QPushButton:hover {
+    background-color: #3d3d3d;
+    border-color: #4d4d4d;
+}
+"""
+
+# Icons are shared by every overlay row; load each one once
+@lru_cache(maxsize=None)
+def get_theme_icon(name):
+    return QIcon.fromTheme(name)
+
+@lru_cache(maxsize=None)
+def get_resource_icon(filename):
+    return QIcon(os.path.join(RESOURCES_DIR, filename))
 
 # Mapping for official documentation URLs
 DOC_BASE_URLS = {
@@ -97,29 +119,30 @@ class OverlayRowWidget(QWidget):
         layout.addWidget(summary_label)
         # Pin button
         self.pin_btn = QToolButton()
-        self.pin_btn.setIcon(QIcon.fromTheme('star' if is_fav else 'star-outline'))
+        self.pin_btn.setIcon(get_theme_icon('star' if is_fav else 'star-outline'))
         self.pin_btn.setCheckable(True)
         self.pin_btn.setChecked(is_fav)
-        self.pin_btn.setStyleSheet('QToolButton { border: none; padding: 0 6px; }')
+        self.pin_btn.setStyleSheet(ROW_BUTTON_STYLE)
         self.pin_btn.clicked.connect(on_pin_clicked)
         layout.addWidget(self.pin_btn)
         # Copy button
         self.copy_btn = QToolButton()
-        self.copy_btn.setIcon(QIcon.fromTheme('edit-copy'))
-        self.copy_btn.setStyleSheet('QToolButton { border: none; padding: 0 6px; }')
+        self.copy_btn.setIcon(get_theme_icon('edit-copy'))
+        self.copy_btn.setStyleSheet(ROW_BUTTON_STYLE)
         self.copy_btn.setToolTip('Copy to clipboard')
         self.copy_btn.clicked.connect(on_copy_clicked)
         layout.addWidget(self.copy_btn)
         # Doc button
         self.doc_btn = QToolButton()
-        self.doc_btn.setIcon(QIcon(os.path.join(os.path.dirname(__file__), '../resources/web.svg')))
-        self.doc_btn.setStyleSheet('QToolButton { border: none; padding: 0 6px; }')
+        self.doc_btn.setIcon(get_resource_icon('web.svg'))
+        self.doc_btn.setStyleSheet(ROW_BUTTON_STYLE)
         self.doc_btn.setToolTip('Open official documentation')
         self.doc_btn.clicked.connect(on_doc_clicked)
         layout.addWidget(self.doc_btn)
         self.setLayout(layout)
         self._tooltip = tooltip
         self._default_bg = self.palette().color(self.backgroundRole())
+        self._highlighted = False
         # Install event filter for robust highlight
         self.installEventFilter(self)
 
@@ -128,20 +151,20 @@ class OverlayRowWidget(QWidget):
             if event.type() == event.Type.Enter:
                 # Only highlight if mouse is truly over the row, not a child
                 if self.rect().contains(self.mapFromGlobal(QCursor.pos())):
-                    QToolTip.showText(self.mapToGlobal(self.rect().center()), self._tooltip, self)
-                    self.setStyleSheet("background: #3a7bd5; border-radius: 7px;")
+                    self.set_highlighted(True)
             elif event.type() == event.Type.Leave:
-                QToolTip.hideText()
-                self.setStyleSheet("")
+                self.set_highlighted(False)
         return super().eventFilter(obj, event)
 
     def set_highlighted(self, highlighted: bool):
         if highlighted:
             QToolTip.showText(self.mapToGlobal(self.rect().center()), self._tooltip, self)
-            self.setStyleSheet("background: #3a7bd5; border-radius: 7px;")
         else:
             QToolTip.hideText()
-            self.setStyleSheet("")
+        # Restyling makes Qt re-parse the sheet for the row and its children
+        if highlighted != self._highlighted:
+            self._highlighted = highlighted
+            self.setStyleSheet(ROW_HIGHLIGHT_STYLE if highlighted else "")
 
 class OverlayWindow:
     def __init__(self):
@@ -154,6 +177,7 @@ class OverlayWindow:
 
 class MovableOverlayWidget(QWidget):
     ctrl_changed = pyqtSignal()
+    selection_detected = pyqtSignal(str, dict)  # selected text, window context
     def __init__(self):
         super().__init__()
         self.setWindowFlags(
@@ -172,6 +196,9 @@ class MovableOverlayWidget(QWidget):
         self._monitor_thread = None
         # AI content storage
         self.ai_content = None
+        self.ai_content_label = None
+        # Query whose completion ai_content_label shows
+        self.ai_content_query = None
         self.selected_text = None
 
         main_layout = QVBoxLayout()
@@ -183,70 +210,19 @@ class MovableOverlayWidget(QWidget):
         # Home button
         self.home_button = QPushButton("Home")
         self.home_button.setFixedSize(60, 30)
-        self.home_button.setStyleSheet("""
-            QPushButton {
-                background-color: #2d2d2d;
-                color: #ffffff;
-                border: 1px solid #3d3d3d;
-                border-radius: 4px;
-                padding: 5px 10px;
-                font-size: 12px;
-            }
-            QPushButton:hover {
-                background-color: #3d3d3d;
-                border-color: #4d4d4d;
-            }
-        """)
+        self.home_button.setStyleSheet(TOP_BUTTON_STYLE)
         self.home_button.clicked.connect(self.lock_home)
         top_layout.addWidget(self.home_button)
         
         # Read button
         self.read_button = QPushButton("Read")
         self.read_button.setFixedSize(60, 30)
-        self.read_button.setStyleSheet("""
-            QPushButton {
-                background-color: #2d2d2d;
-                color: #ffffff;
-                border: 1px solid #3d3d3d;
-                border-radius: 4px;
-                padding: 5px 10px;
-                font-size: 12px;
-            }
-            QPushButton:hover {
-                background-color: #3d3d3d;
-                border-color: #4d4d4d;
-            }
-        """)
+        self.read_button.setStyleSheet(TOP_BUTTON_STYLE)
         self.read_button.clicked.connect(self.unlock_home)
         top_layout.addWidget(self.read_button)
         
-        # AI button (reuse the same style and size)
+        # AI button (AIWidget already gives it the same style and size)
         self.ai_widget = AIWidget()
-        self.ai_widget.toggle_button.setFixedSize(60, 30)
-        self.ai_widget.toggle_button.setStyleSheet("""
-            QPushButton {
-                background-color: #2d2d2d;
-                color: #ffffff;
-                border: 1px solid #3d3d3d;
-                border-radius: 4px;
-                padding: 5px 10px;
-                font-size: 12px;
-            }
-            QPushButton:hover {
-                background-color: #3d3d3d;
-                border-color: #4d4d4d;
-            }
-            QPushButton:checked {
-                background-color: #4CAF50;
-                border-color: #45a049;
-                color: white;
-            }
-            QPushButton:disabled {
-                background-color: #1d1d1d;
-                color: #666666;
-                border-color: #2d2d2d;
-            }
-        """)
         # Connect AI button toggle to text monitoring
         self.ai_widget.toggle_button.toggled.connect(self.toggle_text_monitoring)
         # Connect AI widget completion signal to display AI content
@@ -291,6 +267,7 @@ class MovableOverlayWidget(QWidget):
         self.block_updates = False
         self.force_homepage = False
         self.ctrl_changed.connect(self.update_overlay)
+        self.selection_detected.connect(self._on_selection_detected)
         # Start global Ctrl listener in a thread
         self._start_ctrl_listener()
         
@@ -604,7 +581,8 @@ class MovableOverlayWidget(QWidget):
         # Log current state
         logger.debug(f"update_overlay called. ctrl_pressed={self.ctrl_pressed}, has_focus={self.has_focus}, block_updates={self.block_updates}, home_locked={self.home_locked}, window_title={window_title}")
         
-        # Clear existing content
+        # Clear existing content; the streamed AI label goes with it
+        self.ai_content_label = None
         for i in reversed(range(self.content_layout.count())):
             widget = self.content_layout.itemAt(i).widget()
             if widget:
@@ -915,18 +893,8 @@ class MovableOverlayWidget(QWidget):
                     # Store the selected text
                     self.selected_text = selected_text
                     
-                    # Get cursor position and window info for context
-                    cursor_pos = QCursor.pos()
-                    window_info = self._get_window_info()
-                    context = {
-                        'cursor_pos': cursor_pos,
-                        'app_name': window_info.get('app_name'),
-                        'window_title': window_info.get('window_title'),
-                        'file_extension': window_info.get('file_extension')
-                    }
-                    
-                    # Request explanation with context and pass selected text for display
-                    self.ai_widget.request_explanation(selected_text, context, self.selected_text)
+                    # Hand the selection to the GUI thread, which owns the AI widget
+                    self.selection_detected.emit(selected_text, self._get_window_info())
                 
                 last_selection = selected_text
                 time.sleep(0.2)  # Reduce CPU usage
@@ -935,6 +903,19 @@ class MovableOverlayWidget(QWidget):
                 logger.error(f"Error in cursor monitor: {str(e)}")
                 time.sleep(1)  # Longer delay on error
 
+    def _on_selection_detected(self, selected_text, window_info):
+        """Request an explanation for a new selection; runs on the GUI thread."""
+        # Read the cursor once per selection; nothing downstream queries it again
+        context = {
+            'cursor_pos': QCursor.pos(),
+            'app_name': window_info.get('app_name'),
+            'window_title': window_info.get('window_title'),
+            'file_extension': window_info.get('file_extension')
+        }
+        
+        # Request explanation with context and pass selected text for display
+        self.ai_widget.request_explanation(selected_text, context, selected_text)
+    
     def _get_window_info(self):
         """Get information about the current active window."""
         try:
@@ -1035,12 +1016,21 @@ class MovableOverlayWidget(QWidget):
             logger.error(f"Error getting selection directly: {str(e)}")
             return None
 
-    def display_ai_content(self, completion, query=None):
+    def display_ai_content(self, completion, query=None, partial=False):
         """Display AI-generated content in the overlay."""
-        logger.info("Displaying AI content in overlay")
         self.ai_content = completion
         self.selected_text = query if query else self.selected_text
         
+        if partial:
+            # A hidden overlay is rebuilt once the final completion arrives
+            if not self.isVisible():
+                return
+            # While a completion streams in, update the label showing its query in place
+            if self.ai_content_label is not None and self.ai_content_query == self.selected_text:
+                self.ai_content_label.setText(completion)
+                return
+        
+        logger.info("Displaying AI content in overlay")
         # Force update overlay to display AI content
         self.update_overlay()
 
@@ -1082,6 +1072,8 @@ class MovableOverlayWidget(QWidget):
         content_label.setWordWrap(True)
         content_label.setTextFormat(Qt.TextFormat.RichText)
         ai_layout.addWidget(content_label)
+        self.ai_content_label = content_label
+        self.ai_content_query = self.selected_text
         
         # Action buttons
         button_layout = QHBoxLayout()
@@ -8,7 +8,7 @@ setup(
         "PyQt6",
         "keyboard",
         "torch>=2.0.0",
-        "transformers>=4.30.0",
+        "transformers>=4.38.0",
         "accelerate>=0.20.0",
         "bitsandbytes>=0.39.0",
         "sentencepiece>=0.1.99",